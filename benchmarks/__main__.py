@@ -0,0 +1,82 @@
+# Headless benchmarks for the game's hot paths.
+#
+#   python -m benchmarks --output results.json
+#   python -m benchmarks --baseline results.json
+#
+# Results are medians in milliseconds per call. With --baseline the run is
+# compared against an earlier results file and exits with 1 on regressions.
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+
+from .compare import compare, format_rows
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog = 'python -m benchmarks')
+    parser.add_argument('--maps', nargs = '+', default = ['map', 'map2', 'map3'])
+    parser.add_argument('--repeat', type = int, default = 20)
+    parser.add_argument('--quick', action = 'store_true', help = 'fewer repeats and smaller sweeps')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--output', help = 'write the results as JSON to this file')
+    parser.add_argument('--baseline', help = 'results file to compare against')
+    parser.add_argument('--threshold', type = float, default = 0.15, help = 'relative change that counts as a regression')
+    args = parser.parse_args()
+
+    # the harness changes into the repository root
+    args.output = os.path.abspath(args.output) if args.output else None
+    args.baseline = os.path.abspath(args.baseline) if args.baseline else None
+    return args
+
+def main():
+    args = parse_args()
+
+    if args.quick:
+        repeat = min(args.repeat, 5)
+        sweeps = {'tilled': [100, 500], 'crops': [0, 100], 'trees': [0, 100], 'rain': [1, 5]}
+    else:
+        repeat = args.repeat
+        sweeps = {'tilled': [100, 500, 1000], 'crops': [0, 100, 500], 'trees': [0, 100, 500], 'rain': [1, 5, 30]}
+
+    # keep stdout clean for the JSON report, the game prints while importing
+    with contextlib.redirect_stdout(sys.stderr):
+        from . import harness, scenarios
+        import numpy
+        import pygame
+
+        harness.init_display()
+        results = scenarios.run_all(args.maps, repeat, sweeps, args.seed)
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'numpy': numpy.__version__,
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'seed': args.seed,
+            'sweeps': sweeps},
+        'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent = 2)
+    else:
+        json.dump(report, sys.stdout, indent = 2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        rows = compare(results, baseline, args.threshold)
+        print(format_rows(rows), file = sys.stderr)
+        if any(row[4] == 'regression' for row in rows):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+def compare(results, baseline, threshold):
+    # rows of (name, baseline ms, current ms, ratio, verdict) for benchmarks present in both runs
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['median_ms']
+        after = result['median_ms']
+        ratio = after / before if before else float('inf')
+        if ratio > 1 + threshold:
+            verdict = 'regression'
+        elif ratio < 1 - threshold:
+            verdict = 'improvement'
+        else:
+            verdict = 'unchanged'
+        rows.append((name, before, after, ratio, verdict))
+    return rows
+
+def format_rows(rows):
+    width = max([len(row[0]) for row in rows] + [9])
+    lines = [f"{'benchmark':<{width}}  {'baseline':>10}  {'current':>10}  {'ratio':>6}"]
+    for name, before, after, ratio, verdict in rows:
+        lines.append(f'{name:<{width}}  {before:>8.3f}ms  {after:>8.3f}ms  {ratio:>6.2f}  {verdict}')
+    return '\n'.join(lines)
@@ -0,0 +1,79 @@
+import gc
+import os
+import sys
+import time
+import random
+import statistics
+
+# headless pygame, must be set before pygame is imported
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODE = os.path.join(ROOT, 'code')
+
+# the game loads its assets relative to the repository root and imports its modules flat
+os.chdir(ROOT)
+if CODE not in sys.path:
+    sys.path.insert(0, CODE)
+
+import pygame
+from Settings import *
+
+def init_display():
+    pygame.init()
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+
+def reset_caches():
+    from assets import assets
+    from chunks import clear_chunks
+    assets.clear()
+    clear_chunks()
+
+def seed(value):
+    random.seed(value)
+
+# where the player enters each map, maps without a spawn object start in the middle
+SPAWNS = {'map': 'Start', 'map2': 'Spawn2'}
+
+def build_level(current_map, player = None):
+    from level import Level
+    from mapcache import load_map
+    spawn_location = SPAWNS.get(current_map)
+    if spawn_location is None:
+        tmx_data = load_map(current_map)
+        spawn_location = (tmx_data.width * TITLE_SIZE / 2, tmx_data.height * TITLE_SIZE / 2)
+    level = Level(lambda new_map, spawn: None, current_map, spawn_location, player)
+    level.farm.raining = False
+    return level
+
+def calibrate(func, min_sample = 0.002):
+    # calls per sample so that a sample takes at least min_sample seconds
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    return max(1, int(min_sample / elapsed)) if elapsed else 1000
+
+def measure(func, repeat = 20, number = None, setup = None):
+    # per call times in milliseconds, setup runs untimed before every repeat
+    if number is None:
+        number = calibrate(func)
+
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.disable()
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter_ns() - start) / number / 1e6)
+        gc.enable()
+
+    return {
+        'median_ms': statistics.median(samples),
+        'min_ms': min(samples),
+        'mean_ms': statistics.fmean(samples),
+        'repeat': repeat,
+        'number': number}
@@ -0,0 +1,205 @@
+from .harness import build_level, measure, reset_caches, seed
+
+from itertools import cycle
+import numpy as np
+import pygame
+from Settings import *
+from farm import FARMABLE, TILLED, Simulation
+from mapcache import load_map, get_mask
+from sprites import Particle, Tree
+
+# camera positions the draw and collision benchmarks cycle through
+PROBES = [(640, 360), (1600, 1300), (2560, 2200), (800, 2000), (2400, 600)]
+
+def place_player(player, pos):
+    player.pos.update(pos)
+    player.old_pos.update(pos)
+    player.rect.center = pos
+    player.hitbox.center = pos
+
+def random_cells(level, amount, rng):
+    rows, cols = level.soil_layer.field.grid.shape
+    cells = rng.choice(rows * cols, size = min(amount, rows * cols), replace = False)
+    return [(int(cell % cols), int(cell // cols)) for cell in cells]
+
+def till(level, cells):
+    soil_layer = level.soil_layer
+    for x, y in cells:
+        soil_layer.field.grid[y, x] |= FARMABLE | TILLED
+    soil_layer.create_soil_tiles()
+
+def plant(level, cells, seeds = ('corn', 'tomato')):
+    for index, (x, y) in enumerate(cells):
+        level.soil_layer.plant_seed((x * TITLE_SIZE + TITLE_SIZE // 2, y * TITLE_SIZE + TITLE_SIZE // 2), seeds[index % len(seeds)])
+
+def add_trees(level, amount, rng):
+    surf = next(iter(level.tree_sprites)).image if level.tree_sprites else pygame.Surface((56, 116))
+    width, height = level.ground_sprite.rect.size
+    for _ in range(amount):
+        tree = Tree(
+            pos = (int(rng.integers(0, width - surf.get_width())), int(rng.integers(0, height - surf.get_height()))),
+            surf = surf,
+            groups = [level.all_sprites, level.collision_sprites, level.tree_sprites],
+            name = 'Small',
+            player_add = level.player_add)
+        level.farm.trees.append(tree.fruit_tree)
+
+def draw_probes(level):
+    positions = cycle(PROBES)
+    def draw():
+        place_player(level.player, next(positions))
+        level.all_sprites.custom_draw(level.player)
+    return draw
+
+def collision_probes(level):
+    player = level.player
+    positions = cycle(PROBES)
+    def collide():
+        place_player(player, next(positions))
+        player.direction.update(1, 1)
+        player.collision('horizontal')
+        player.collision('vertical')
+    return collide
+
+def bench_load(maps, repeat, base_player):
+    results = {}
+    for current_map in maps:
+        player = None if current_map == 'map' else base_player
+        results[f'load_cold/{current_map}'] = measure(lambda: build_level(current_map, player), max(repeat // 5, 2), 1, reset_caches)
+        results[f'load_warm/{current_map}'] = measure(lambda: build_level(current_map, player), max(repeat // 5, 2), 1)
+    return results
+
+def bench_map(maps, repeat, base_player):
+    results = {}
+    for current_map in maps:
+        level = build_level(current_map, None if current_map == 'map' else base_player)
+        results[f'draw/{current_map}'] = measure(draw_probes(level), repeat)
+        results[f'collision/{current_map}'] = measure(collision_probes(level), repeat)
+        results[f'reset/{current_map}'] = measure(level.reset, repeat)
+    return results
+
+def bench_soil(sizes, repeat, base_player, rng):
+    results = {}
+    for tilled in sizes:
+        level = build_level('map', base_player)
+        till(level, random_cells(level, tilled, rng))
+        results[f'create_soil_tiles/tilled={tilled}'] = measure(level.soil_layer.create_soil_tiles, repeat)
+
+        # a single hoe hit on a fresh farmable cell
+        soil_layer = level.soil_layer
+        fresh = np.argwhere(soil_layer.field.grid == 0).tolist()
+        def hoe():
+            y, x = fresh.pop()
+            soil_layer.field.grid[y, x] |= FARMABLE
+            soil_layer.get_hit((x * TITLE_SIZE + 1, y * TITLE_SIZE + 1))
+        results[f'hoe/tilled={tilled}'] = measure(hoe, repeat, 1)
+    return results
+
+def bench_crops(sizes, repeat, base_player, rng):
+    results = {}
+    for crops in sizes:
+        level = build_level('map', base_player)
+        cells = random_cells(level, crops, rng)
+        till(level, cells)
+        plant(level, cells)
+        level.soil_layer.field.water_all()
+        level.soil_layer.create_water_tiles()
+        results[f'reset/crops={crops}'] = measure(level.reset, repeat)
+        results[f'draw/crops={crops}'] = measure(draw_probes(level), repeat)
+    return results
+
+def bench_trees(sizes, repeat, base_player, rng):
+    results = {}
+    for trees in sizes:
+        level = build_level('map', base_player)
+        add_trees(level, trees, rng)
+        results[f'reset/trees={trees}'] = measure(level.reset, repeat)
+        results[f'draw/trees={trees}'] = measure(draw_probes(level), repeat)
+        results[f'collision/trees={trees}'] = measure(collision_probes(level), repeat)
+    return results
+
+def bench_rain(durations, repeat, base_player):
+    results = {}
+    step = 1 / TICK_RATE
+    for duration in durations:
+        level = build_level('map', base_player)
+        level.farm.raining = True
+        for _ in range(int(duration * TICK_RATE)):
+            level.rain.update(step, True)
+        results[f'rain_update/seconds={duration}'] = measure(lambda: level.rain.update(step, True), repeat)
+        results[f'draw/rain_seconds={duration}'] = measure(draw_probes(level), repeat)
+    return results
+
+def same_state(state, other):
+    soil, other_soil = state['soil'], other['soil']
+    return (np.array_equal(soil['grid'], other_soil['grid'])
+        and sorted(soil['plants']) == sorted(other_soil['plants'])
+        and state['trees'] == other['trees']
+        and state['raining'] == other['raining']
+        and state['day'] == other['day'])
+
+def bench_eviction(repeat, base_player, rng):
+    # a farmed level pushed out of the level cache by a zero budget, then rebuilt from its dormant state
+    from collections import OrderedDict
+    from main import Game
+
+    level = build_level('map', base_player)
+    cells = random_cells(level, 100, rng)
+    till(level, cells)
+    plant(level, cells[:50])
+    level.soil_layer.field.water_all()
+    level.soil_layer.create_water_tiles()
+    for tree in list(level.tree_sprites)[:3]:
+        while tree.fruit_tree.alive:
+            tree.damage()
+            tree.check_death()
+    state = level.get_state()
+    # the falling apples fade out, the rest comes back
+    sprites = sum(not isinstance(sprite, Particle) for sprite in level.all_sprites)
+
+    # only the level cache of a game, without a window or a save
+    game = Game.__new__(Game)
+    game.levels = OrderedDict([('map', level), ('map2', build_level('map2', base_player))])
+    game.dormant_levels = {}
+    game.evict_levels(budget = 0)
+    if list(game.levels) != ['map2'] or 'map' not in game.dormant_levels:
+        raise RuntimeError('the level cache did not evict map')
+
+    def restore():
+        restored = build_level('map', base_player)
+        restored.load_state(game.dormant_levels['map'])
+        return restored
+    restored = restore()
+    if not same_state(state, restored.get_state()) or len(restored.all_sprites) != sprites:
+        raise RuntimeError('map changed on its way through the dormant state')
+
+    return {
+        'evict/map': measure(level.get_state, repeat),
+        'restore/map': measure(restore, max(repeat // 5, 2), 1)}
+
+def bench_farm(policies, repeat, random_seed):
+    # one day of the headless simulation, no level involved
+    tmx_data = load_map('map')
+    farmable = get_mask(tmx_data, 'Farmable')
+    tree_names = [obj.name for obj in tmx_data.get_layer_by_name('Trees')]
+    results = {}
+    for policy in policies:
+        sim = Simulation(farmable, tree_names, policy, random_seed, 32)
+        results[f'farm_day/{policy}'] = measure(lambda: sim.run(1), repeat)
+    return results
+
+def run_all(maps, repeat, sweeps, random_seed = 0):
+    seed(random_seed)
+    rng = np.random.default_rng(random_seed)
+
+    base_player = build_level('map').player
+    results = {}
+    results.update(bench_load(maps, repeat, base_player))
+    results.update(bench_map(maps, repeat, base_player))
+    results.update(bench_soil(sweeps['tilled'], repeat, base_player, rng))
+    results.update(bench_crops(sweeps['crops'], repeat, base_player, rng))
+    results.update(bench_trees(sweeps['trees'], repeat, base_player, rng))
+    results.update(bench_rain(sweeps['rain'], repeat, base_player))
+    results.update(bench_eviction(repeat, base_player, rng))
+    results.update(bench_farm(['idle', 'mixed', 'forager'], repeat, random_seed))
+    return results
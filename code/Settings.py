@@ -1,11 +1,110 @@
+import pygame
 from pygame.math import Vector2
 # Screen
 SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
 TITLE_SIZE = 64
+
+# Loop
+TICK_RATE = 60             # simulation steps per second
+FRAME_RATE = 120           # render cap, 0 = uncapped
+VSYNC = False
+MAX_FRAME_TIME = 0.25      # simulated time is dropped beyond this after a stall
+THROTTLE_UNFOCUSED = True
+UNFOCUSED_FRAME_RATE = 10
+DIRTY_RECTS = False        # only redraw and present the parts of the screen that changed
+DIRTY_RECTS_MAX_AREA = 0.5 # share of the screen beyond which the whole frame is redrawn
+CHUNK_SIZE = 512
+
+# Profiler: F3 shows the frame time hud, F4 starts/stops writing a trace (.json = chrome trace, .csv)
+PROFILER_HUD_KEY = pygame.K_F3
+PROFILER_RECORD_KEY = pygame.K_F4
+PROFILER_TRACE_PATH = 'profile_trace.json'
+PROFILER_WINDOW = 300          # frames in the rolling percentiles
+PROFILER_HUD_REFRESH = 250     # ms
+# startup: time per phase up to the first frame, written on every start (None = off)
+STARTUP_TRACE_PATH = 'data/cache/startup_trace.json'
+ASSET_DECODE_THREADS = 4
+
+# byte budget of the asset cache, None keeps every decoded asset
+ASSET_CACHE_BYTES = None
+
+# sound effects: file, volume, how many may play at once and priority (a busy mixer drops lower ones first)
+# decoded up front when a level loads, every object plays the one shared copy
+SOUNDS = {
+    'success': ('audio/success.wav', 0.3, 2, 2),
+    'hoe': ('audio/hoe.wav', 0.1, 2, 1),
+    'plant': ('audio/plant.wav', 0.2, 2, 1),
+    'axe': ('audio/axe.mp3', 1.0, 3, 1),
+    'water': ('audio/water.mp3', 0.2, 1, 1),
+}
+# mixer channels the sound effects share, the music streams outside of them
+SOUND_CHANNELS = 8
+
+# music streamed from disk per map, fading over MUSIC_FADE seconds when the track changes
+MAP_MUSIC = {
+    'map': 'audio/bg.mp3',
+    'map2': 'audio/bg.mp3',
+    'map3': 'audio/bg.mp3',
+}
+MUSIC_VOLUME = 0.2
+MUSIC_FADE = 1.0
 GREEN = (0,255,0)
 BLACK = (0,0,0)
 
+# Maps: tmx file and pre-rendered ground image
+MAPS = {
+    'map': ('data/map.tmx', 'graphics/world/ground.png'),
+    'map2': ('data/map2.tmx', 'graphics/world/ground2.png'),
+    'map3': ('data/map3.tmx', None),
+}
+GROUND_LAYERS = ["Water", "Ground", "Forest Grass", "Outside Decoration", "Hills"]
+
+# compiled maps (python code/mapcache.py), rebuilt on demand when a tmx or tsx changes
+MAP_CACHE_DIR = 'data/cache'
+
+# interaction objects that lead to another map -> (map, spawn object)
+MAP_EXITS = {
+    'Map1': ('map', 'Spawn1'),
+    'Map2': ('map2', 'Spawn2'),
+    'Map3': ('map3', 'Spawn3'),
+}
+
+# memory the visited levels may use, the least recently visited ones are reduced to their state
+# a level takes about 35 MB, so both maps the player can walk between stay built, the benchmarks force eviction
+LEVEL_CACHE_BYTES = 80 * 1024 * 1024
+
+# autosave, every this many deltas the save file is compacted into one full snapshot
+SAVE_PATH = 'saves/autosave.dat'
+SAVE_COMPACT_EVERY = 16
+
+# lighting: light map resolution divider, brightness steps of the cached glows and lamps
+LIGHTING_SCALE = 1
+LIGHT_LEVELS = 16
+LIGHT_COLOR = (255, 190, 110)
+LIGHT_SOURCES = {
+    'Bed': (200, LIGHT_COLOR),
+}
+
+# maps that get parsed and baked in the background while the player is on a map
+# (map3 has no exit leading to it yet, so nothing preloads it)
+MAP_NEIGHBOURS = {
+    'map': ['map2'],
+    'map2': ['map'],
+    'map3': ['map'],
+}
+
+# transparent colour of opaque ui panels, never used in the ui graphics
+UI_COLORKEY = (255, 0, 255)
+
+# texture atlas (python code/atlas.py): the images of these folders packed into a few pages,
+# rebuilt on demand when one of them changes
+ATLAS_DIR = 'data/cache'
+ATLAS_FOLDERS = [
+    'graphics/character', 'graphics/water', 'graphics/soil', 'graphics/soil_water',
+    'graphics/rain', 'graphics/fruit', 'graphics/overlay', 'graphics/stumps']
+ATLAS_PAGE_SIZE = 1024
+
 #Overlay position
 OVERLAY_POSITIONS = {
     "tool" : (40, SCREEN_HEIGHT - 15),
@@ -38,10 +137,20 @@ APPLE_POS = {
     "Large": [(30,34), (60,65), (50,50), (16,40), (45,50), (42,70)]
 }
 
+# rain particles spawned per second of game time, over the whole map
+RAIN_DROPS_PER_SECOND = 600
+RAIN_FLOOR_PER_SECOND = 600
+
 GROW_SPEED = {
     'corn': 1,
     'tomato': 0.7
 }
+# last growth stage, graphics/fruit/<plant> has a frame for each one
+PLANT_MAX_AGE = {
+    'corn': 3,
+    'tomato': 3
+}
+TREE_HEALTH = 5
 SALE_PRICES = {
     'wood': 4,
     'apple': 2,
@@ -51,4 +160,17 @@ SALE_PRICES = {
 PURCHASE_PRICES = {
     'corn': 4,
     'tomato': 5
-}
\ No newline at end of file
+}
+
+# what a new game starts with
+START_ITEMS = {
+    'wood': 0,
+    'apple': 0,
+    'corn': 0,
+    'tomato': 0,
+}
+START_SEEDS = {
+    'corn': 5,
+    'tomato': 5
+}
+START_MONEY = 200
\ No newline at end of file
@@ -1,24 +1,30 @@
-from os import walk
 import pygame
+from assets import assets
+from atlas import atlas
+
+def import_image(path):
+    # packed images are cut from an atlas page, anything else is loaded from its file
+    image_surf = atlas.image(path)
+    if image_surf is None:
+        image_surf = assets.image(path)
+    return image_surf
 
 def import_folder(path):
     surface_list = []
 
-    for _, __, img_files in walk(path):
-        for image in img_files:
-            full_path = path + '/' + image
-            image_surf = pygame.image.load(full_path).convert_alpha()
-            surface_list.append(image_surf)
+    for image in atlas.folder(path) or assets.folder(path):
+        full_path = path + '/' + image
+        image_surf = import_image(full_path)
+        surface_list.append(image_surf)
 
     return surface_list
 
 def import_folder_dict(path):
     surface_dict = {}
 
-    for _, __, img_files in walk(path):
-        for image in img_files:
-            full_path = path + '/' + image
-            image_surf = pygame.image.load(full_path).convert_alpha()
-            surface_dict[image.split('.')[0]] = image_surf
+    for image in atlas.folder(path) or assets.folder(path):
+        full_path = path + '/' + image
+        image_surf = import_image(full_path)
+        surface_dict[image.split('.')[0]] = image_surf
 
     return surface_dict
\ No newline at end of file
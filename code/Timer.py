@@ -1,23 +1,79 @@
-import pygame
+import heapq
+from itertools import count
+
+class ScheduledCall:
+    def __init__(self, due, func, interval):
+        self.due = due
+        self.func = func
+        self.interval = interval
+        self.active = True
+
+    def cancel(self):
+        # stays in the heap, it is skipped when it comes up
+        self.active = False
+
+class Scheduler:
+    def __init__(self):
+
+        # seconds of game time, only advanced by update
+        self.time = 0
+        self.paused = False
+
+        # heap of (due, order, call), order keeps calls due at the same time in scheduling order
+        self.heap = []
+        self.order = count()
+
+    def schedule(self, delay, func, repeat = False):
+        # repeating calls come back every delay seconds until they are cancelled
+        call = ScheduledCall(self.time + delay, func, delay if repeat else None)
+        heapq.heappush(self.heap, (call.due, next(self.order), call))
+        return call
+
+    def update(self, dt):
+        if self.paused:
+            return
+        self.time += dt
+
+        # only the calls that are due are looked at, however many are waiting
+        heap = self.heap
+        while heap and heap[0][0] <= self.time:
+            _, _, call = heapq.heappop(heap)
+            if not call.active:
+                continue
+            if call.interval:
+                call.due += call.interval
+                heapq.heappush(heap, (call.due, next(self.order), call))
+            else:
+                call.active = False
+            call.func()
 
 class Timer:
-    def __init__(self,duration,func = None):
+    def __init__(self,duration,func = None, clock = None):
+        # duration in ms of game time
         self.duration = duration
         self.func = func
-        self.start_time = 0
+        self.clock = clock or sim_clock
+        self.call = None
         self.active = False
 
     def activate(self):
+        if self.call:
+            self.call.cancel()
         self.active = True
-        self.start_time = pygame.time.get_ticks()
+        self.call = self.clock.schedule(self.duration / 1000, self.expire)
 
     def deactivate(self):
         self.active = False
-        self.start_time = 0
-
-    def update(self):
-        current_time = pygame.time.get_ticks()
-        if current_time - self.start_time >= self.duration:
-            if self.func and self.start_time != 0:
-                self.func()
-            self.deactivate()
\ No newline at end of file
+        if self.call:
+            self.call.cancel()
+            self.call = None
+
+    def expire(self):
+        self.active = False
+        self.call = None
+        if self.func:
+            self.func()
+
+# the simulation stops while the shop is open, the ui keeps running
+sim_clock = Scheduler()
+ui_clock = Scheduler()
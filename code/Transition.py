@@ -13,8 +13,9 @@ class Transition:
         self.image = pygame.Surface((SCREEN_WIDTH,SCREEN_HEIGHT))
         self.color = 255
         self.speed = -2
+        self.filled = None
 
-    def play(self):
+    def update(self):
         self.color += self.speed
         if self.color <= 0:
             self.speed *= -1
@@ -25,5 +26,46 @@ class Transition:
             self.player.sleep = False
             self.speed = -2
 
-        self.image.fill((self.color,self.color,self.color))
-        self.display_surf.blit(self.image,(0,0), special_flags = pygame.BLEND_RGBA_MULT)
\ No newline at end of file
+    def display(self):
+        # white changes nothing, and the overlay is only refilled when the shade changes
+        if self.color == 255:
+            return
+        if self.color != self.filled:
+            self.filled = self.color
+            self.image.fill((self.color,self.color,self.color))
+        self.display_surf.blit(self.image,(0,0), special_flags = pygame.BLEND_RGBA_MULT)
+
+class LoadingFade:
+    def __init__(self):
+
+        #setup
+        self.display_surf = pygame.display.get_surface()
+
+        # overlay
+        self.image = pygame.Surface((SCREEN_WIDTH,SCREEN_HEIGHT))
+        self.color = 255
+        self.speed = -600
+        self.filled = None
+
+        # progress bar
+        self.bar_rect = pygame.Rect(0, 0, SCREEN_WIDTH // 3, 8)
+        self.bar_rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT - 60)
+
+    def start(self):
+        self.color = 255
+
+    def update(self, dt):
+        # fades out and stays dark until the map is loaded
+        self.color = max(self.color + self.speed * dt, 60)
+
+    def display(self, progress):
+        color = int(self.color)
+        if color != self.filled:
+            self.filled = color
+            self.image.fill((color,color,color))
+        self.display_surf.blit(self.image,(0,0), special_flags = pygame.BLEND_RGBA_MULT)
+
+        bar = self.bar_rect.copy()
+        bar.width = int(bar.width * progress)
+        pygame.draw.rect(self.display_surf, 'White', bar)
+        pygame.draw.rect(self.display_surf, 'White', self.bar_rect, 1)
\ No newline at end of file
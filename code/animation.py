@@ -0,0 +1,43 @@
+from enum import IntEnum
+from Settings import *
+from Support import import_folder
+
+class Direction(IntEnum):
+    UP = 0
+    DOWN = 1
+    LEFT = 2
+    RIGHT = 3
+
+class Action(IntEnum):
+    MOVE = 0
+    IDLE = 1
+    HOE = 2
+    AXE = 3
+    WATER = 4
+
+TOOL_ACTIONS = {'hoe': Action.HOE, 'axe': Action.AXE, 'water': Action.WATER}
+
+def get_state(direction, action):
+    # every direction and action pair as one small int, the index into the tables below
+    return direction * len(Action) + action
+
+def get_animation_name(direction, action):
+    # folder names: 'up' walks, 'up_idle', 'up_hoe', ...
+    if action == Action.MOVE:
+        return direction.name.lower()
+    return f'{direction.name.lower()}_{action.name.lower()}'
+
+class AnimationTable:
+    def __init__(self, folder):
+        # frames of every state, shared by everything using this table
+        self.frames = [import_folder(f'{folder}/{get_animation_name(direction, action)}') for direction in Direction for action in Action]
+
+        # where tools hit, per direction
+        self.tool_offsets = [PLAYER_TOOL_OFFSET[direction.name.lower()] for direction in Direction]
+
+tables = {}
+
+def get_animation_table(name, folder):
+    if name not in tables:
+        tables[name] = AnimationTable(folder)
+    return tables[name]
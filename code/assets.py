@@ -0,0 +1,110 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+import pygame
+from Settings import *
+
+class AssetCache:
+    def __init__(self, max_bytes = None):
+
+        # decoded assets by normalized path, least recently used first
+        self.entries = OrderedDict()
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        # the preloader fills the cache from its own thread
+        self.lock = threading.Lock()
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, kind, path):
+        return kind, os.path.normcase(os.path.abspath(path))
+
+    def get(self, key, load, get_size):
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+            self.misses += 1
+
+        # decode outside the lock, so one thread never waits on another thread's unrelated asset
+        asset = load()
+        size = get_size(asset)
+        with self.lock:
+            # both threads decoded the same asset, keep the first one
+            if key in self.entries:
+                return self.entries[key][0]
+            self.entries[key] = (asset, size)
+            self.bytes += size
+            self.evict()
+        return asset
+
+    def evict(self):
+        # assets that are still in use stay alive through their owners, the cache just lets go of them
+        if self.max_bytes is None:
+            return
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, size) = self.entries.popitem(last = False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def image(self, path, decoded = None):
+        # decoded: the file was already read on a worker thread, only the conversion is left
+        return self.get(
+            self.key('image', path),
+            lambda: (decoded if decoded is not None else pygame.image.load(path)).convert_alpha(),
+            lambda surf: surf.get_pitch() * surf.get_height())
+
+    def sound(self, path, decoded = None):
+        # one Sound is shared by everything that plays the file, so its volume is never set,
+        # the sound bank sets it on the channel that plays it
+        return self.get(
+            self.key('sound', path),
+            lambda: decoded if decoded is not None else pygame.mixer.Sound(path),
+            sound_size)
+
+    def has(self, kind, path):
+        with self.lock:
+            return self.key(kind, path) in self.entries
+
+    def folder(self, path):
+        # file names of a folder, sorted so animation frames come in order on every file system
+        return self.get(
+            self.key('folder', path),
+            lambda: sorted((image for _, __, img_files in os.walk(path) for image in img_files), key = natural_key),
+            lambda names: 0)
+
+    def discard(self, kind, path):
+        with self.lock:
+            entry = self.entries.pop(self.key(kind, path), None)
+            if entry:
+                self.bytes -= entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.bytes}
+
+def natural_key(name):
+    # '10.png' comes after '9.png'
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+def sound_size(sound):
+    frequency, size, channels = pygame.mixer.get_init()
+    return int(sound.get_length() * frequency * channels * abs(size) // 8)
+
+assets = AssetCache(ASSET_CACHE_BYTES)
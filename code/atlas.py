@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import pygame
+from Settings import *
+from assets import assets
+from mapcache import get_stamps, save_json
+
+# bump when the page layout changes, older atlases are packed again
+ATLAS_VERSION = 2
+
+def get_atlas_paths():
+    # pages are stored uncompressed, loading one is a copy instead of a png decode
+    return {
+        'meta': os.path.join(ATLAS_DIR, 'atlas.json'),
+        'page': os.path.join(ATLAS_DIR, 'atlas{}.bmp')}
+
+def normalize(path):
+    return os.path.normcase(os.path.abspath(path))
+
+def get_folders():
+    # every folder below the atlas folders, with the file names import_folder sees
+    return {
+        folder.replace(os.sep, '/'): assets.folder(folder)
+        for root in ATLAS_FOLDERS
+        for folder, _, _ in os.walk(root)}
+
+def get_sources(folders):
+    # folders are stamped as well, their mtime changes when files are added or removed
+    files = [f'{folder}/{name}' for folder, names in folders.items() for name in names if os.path.isfile(f'{folder}/{name}')]
+    return list(folders) + files
+
+def pack_atlas():
+    paths = get_atlas_paths()
+    folders = get_folders()
+    sources = get_sources(folders)
+    files = sources[len(folders):]
+    os.makedirs(ATLAS_DIR, exist_ok = True)
+
+    # shelf packing, tallest first so the rows waste little height
+    images = {path: pygame.image.load(path) for path in files}
+    order = sorted(images, key = lambda path: (-images[path].get_height(), path))
+    entries, pages = {}, [[]]
+    x = y = row_height = 0
+    for path in order:
+        width, height = images[path].get_size()
+        if x and x + width > ATLAS_PAGE_SIZE:
+            x, y, row_height = 0, y + row_height, 0
+        if y and y + height > ATLAS_PAGE_SIZE:
+            x = y = row_height = 0
+            pages.append([])
+        entries[path] = [len(pages) - 1, x, y, width, height]
+        pages[-1].append(path)
+        x += width
+        row_height = max(row_height, height)
+
+    page_files = []
+    for index, page in enumerate(pages):
+        width = max((entries[path][1] + entries[path][3] for path in page), default = 1)
+        height = max((entries[path][2] + entries[path][4] for path in page), default = 1)
+        sheet = pygame.Surface((width, height), pygame.SRCALPHA)
+        for path in page:
+            # blitting onto transparent pixels copies the source as it is
+            sheet.blit(images[path], entries[path][1:3])
+
+        # pygame picks the format from the extension
+        page_path = paths['page'].format(index)
+        pygame.image.save(sheet, page_path + '.tmp.bmp')
+        os.replace(page_path + '.tmp.bmp', page_path)
+        assets.discard('image', page_path)
+        page_files.append(page_path)
+
+    # the metadata goes last, pages without it are never read
+    save_json(paths['meta'], {
+        'version': ATLAS_VERSION,
+        'roots': ATLAS_FOLDERS,
+        'sources': get_stamps(sources),
+        'pages': page_files,
+        'folders': folders,
+        'images': entries})
+
+def is_fresh(meta):
+    if meta.get('version') != ATLAS_VERSION or meta.get('roots') != ATLAS_FOLDERS:
+        return False
+    try:
+        return get_stamps([path for path, _, _ in meta['sources']]) == meta['sources']
+    except OSError:
+        return False
+
+class Atlas:
+    def __init__(self):
+
+        # the index is read the first time an image is asked for
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.pages = []
+        self.folders = {}
+        self.entries = {}
+
+        # subsurfaces already cut, so every caller gets the same surface like with the asset cache
+        self.images = {}
+
+    def load(self):
+        paths = get_atlas_paths()
+        try:
+            with open(paths['meta']) as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            meta = {}
+
+        try:
+            # missing or stale, pack it now so the next start is fast
+            if not is_fresh(meta):
+                pack_atlas()
+                with open(paths['meta']) as file:
+                    meta = json.load(file)
+        except (OSError, pygame.error):
+            # the images are loaded one by one then
+            return
+        self.pages = meta['pages']
+        self.folders = {normalize(folder): names for folder, names in meta['folders'].items()}
+        self.entries = {normalize(path): entry for path, entry in meta['images'].items()}
+
+    def ensure_loaded(self):
+        with self.lock:
+            if not self.loaded:
+                self.loaded = True
+                self.load()
+
+    def get_pages(self):
+        self.ensure_loaded()
+        return list(self.pages)
+
+    def folder(self, path):
+        # file names of a packed folder, None for folders outside the atlas
+        self.ensure_loaded()
+        return self.folders.get(normalize(path))
+
+    def image(self, path):
+        # a packed image as a subsurface of its page, None for images outside the atlas
+        self.ensure_loaded()
+        key = normalize(path)
+        if key not in self.entries:
+            return None
+        if key not in self.images:
+            page, x, y, width, height = self.entries[key]
+            self.images[key] = assets.image(self.pages[page]).subsurface((x, y, width, height))
+        return self.images[key]
+
+atlas = Atlas()
+
+if __name__ == '__main__':
+    # offline packing: python code/atlas.py, from the project folder
+    pack_atlas()
+    print(f'packed {", ".join(ATLAS_FOLDERS)} -> {get_atlas_paths()["meta"]}')
@@ -0,0 +1,85 @@
+from itertools import count
+import pygame
+from Settings import *
+from assets import assets
+
+class Music:
+    def __init__(self):
+
+        # track that is playing and the one that should, they differ while fading out
+        self.track = None
+        self.next_track = None
+        self.volume = 0
+
+    def play(self, path):
+        self.next_track = path
+
+    def update(self, dt):
+        # real time, the music keeps fading while the game is paused
+        if not pygame.mixer.get_init():
+            return
+        step = dt / MUSIC_FADE * MUSIC_VOLUME if MUSIC_FADE else MUSIC_VOLUME
+        if self.next_track != self.track:
+            # the mixer streams a single track, so the old one fades out before the next one fades in
+            self.volume = max(self.volume - step, 0)
+            if not self.volume:
+                self.track = self.next_track
+                if self.track:
+                    pygame.mixer.music.load(self.track)
+                    pygame.mixer.music.play(loops = -1)
+                else:
+                    pygame.mixer.music.stop()
+        elif self.track:
+            self.volume = min(self.volume + step, MUSIC_VOLUME)
+        pygame.mixer.music.set_volume(self.volume)
+
+class SoundBank:
+    def __init__(self):
+
+        # fixed channel pool, created with the first sound
+        self.channels = []
+        # channel index -> (sound name, priority, start order) of what it played last
+        self.playing = {}
+        self.order = count()
+
+    def setup(self):
+        pygame.mixer.set_num_channels(SOUND_CHANNELS)
+        self.channels = [pygame.mixer.Channel(index) for index in range(SOUND_CHANNELS)]
+
+    def get_channel(self, name, limit, priority):
+        self.playing = {index: playing for index, playing in self.playing.items() if self.channels[index].get_busy()}
+
+        # at its limit a sound starts its oldest instance over
+        instances = sorted((order, index) for index, (playing_name, _, order) in self.playing.items() if playing_name == name)
+        if len(instances) >= limit:
+            return instances[0][1]
+
+        for index in range(len(self.channels)):
+            if index not in self.playing:
+                return index
+
+        # every channel is busy, the oldest of the least important sounds makes room
+        candidates = [(playing_priority, order, index) for index, (_, playing_priority, order) in self.playing.items() if playing_priority <= priority]
+        if candidates:
+            return min(candidates)[2]
+        return None
+
+    def play(self, name):
+        if not pygame.mixer.get_init():
+            return None
+        if not self.channels:
+            self.setup()
+        path, volume, limit, priority = SOUNDS[name]
+        index = self.get_channel(name, limit, priority)
+        if index is None:
+            return None
+
+        channel = self.channels[index]
+        channel.play(assets.sound(path))
+        # the volume goes on the channel, the shared sound itself is never changed
+        channel.set_volume(volume)
+        self.playing[index] = (name, priority, next(self.order))
+        return channel
+
+music = Music()
+sound_bank = SoundBank()
@@ -0,0 +1,109 @@
+import threading
+import pygame
+from Settings import *
+from sprites import Generic
+
+# baked surfaces, keyed by (map, layer, chunk), the preloader bakes from its own thread
+baked_chunks = {}
+# keys a thread is baking right now, other threads wait for them instead of baking them again
+baking = set()
+baked_condition = threading.Condition()
+
+def get_baked(key, bake):
+    with baked_condition:
+        while key in baking:
+            baked_condition.wait()
+        if key in baked_chunks:
+            return baked_chunks[key]
+        baking.add(key)
+
+    # bake outside the lock, releasing a map never waits for a bake
+    try:
+        baked = bake()
+        with baked_condition:
+            baked_chunks[key] = baked
+        return baked
+    finally:
+        with baked_condition:
+            baking.discard(key)
+            baked_condition.notify_all()
+
+def get_tiles(tmx_data, layer_names):
+    tiles = []
+    for layer_name in layer_names:
+        for x, y, surf in tmx_data.get_layer_by_name(layer_name).tiles():
+            tiles.append((surf.get_rect(topleft = (x * TITLE_SIZE, y * TITLE_SIZE)), surf))
+
+    # same order the camera would have drawn the single tiles in
+    tiles.sort(key = lambda tile: tile[0].centery)
+    return tiles
+
+def bake_tiles(tiles, area):
+    surf = pygame.Surface(area.size, pygame.SRCALPHA)
+    surf.blits([(tile_surf, tile_rect.move(-area.x, -area.y)) for tile_rect, tile_surf in tiles], False)
+    return surf.convert_alpha()
+
+def bake_chunk(chunk_tiles):
+    area = chunk_tiles[0][0].unionall([tile_rect for tile_rect, _ in chunk_tiles])
+    return area.topleft, bake_tiles(chunk_tiles, area)
+
+def bake_chunks(map_name, tiles, z):
+    chunks = {}
+    for tile_rect, surf in tiles:
+        chunk = (tile_rect.x // CHUNK_SIZE, tile_rect.y // CHUNK_SIZE)
+        chunks.setdefault(chunk, []).append((tile_rect, surf))
+
+    return [get_baked((map_name, z, chunk), lambda chunk_tiles = chunk_tiles: bake_chunk(chunk_tiles)) for chunk, chunk_tiles in chunks.items()]
+
+def bake_row(centery, row_tiles):
+    half_height = max(max(centery - tile_rect.top, tile_rect.bottom - centery) for tile_rect, _ in row_tiles)
+    left = min(tile_rect.left for tile_rect, _ in row_tiles)
+    right = max(tile_rect.right for tile_rect, _ in row_tiles)
+    area = pygame.Rect(left, centery - half_height, right - left, half_height * 2)
+    return area.topleft, bake_tiles(row_tiles, area)
+
+def bake_rows(map_name, tiles, z):
+    # tiles on the main layer are y-sorted against the player, so every row of a chunk
+    # becomes its own strip that is centered on the same y as the tiles it replaces
+    rows = {}
+    for tile_rect, surf in tiles:
+        row = (tile_rect.x // CHUNK_SIZE, tile_rect.centery)
+        rows.setdefault(row, []).append((tile_rect, surf))
+
+    return [get_baked((map_name, z, row), lambda row = row, row_tiles = row_tiles: bake_row(row[1], row_tiles)) for row, row_tiles in rows.items()]
+
+def bake_ground(map_name, tmx_data):
+    def bake():
+        layer_names = [layer for layer in GROUND_LAYERS if layer in tmx_data.layernames]
+        tiles = []
+        for layer_name in layer_names:
+            for x, y, surf in tmx_data.get_layer_by_name(layer_name).tiles():
+                tiles.append((surf.get_rect(topleft = (x * TITLE_SIZE, y * TITLE_SIZE)), surf))
+        area = pygame.Rect(0, 0, tmx_data.width * TITLE_SIZE, tmx_data.height * TITLE_SIZE)
+        return bake_tiles(tiles, area)
+    return get_baked((map_name, LAYERS['ground'], None), bake)
+
+def get_fence_layer(tmx_data):
+    return "Fence" if "Fence" in tmx_data.layernames else "Fences"
+
+def get_static_layers(tmx_data):
+    return [
+        (["HouseFloor", "HouseFurnitureBottom"], LAYERS["house bottom"]),
+        (["HouseWalls", "HouseFurnitureTop", get_fence_layer(tmx_data)], LAYERS["main"])]
+
+def bake_static_layer(map_name, tmx_data, layer_names, z):
+    bake = bake_rows if z == LAYERS['main'] else bake_chunks
+    return bake(map_name, get_tiles(tmx_data, layer_names), z)
+
+def release_map(map_name):
+    with baked_condition:
+        for key in [key for key in baked_chunks if key[0] == map_name]:
+            del baked_chunks[key]
+
+def clear_chunks():
+    with baked_condition:
+        baked_chunks.clear()
+
+def create_static_layer(map_name, tmx_data, layer_names, groups, z):
+    for pos, surf in bake_static_layer(map_name, tmx_data, layer_names, z):
+        Generic(pos, surf, groups, z)
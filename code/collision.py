@@ -0,0 +1,61 @@
+import pygame
+from Settings import *
+
+class CollisionGroup(pygame.sprite.Group):
+    def __init__(self, *sprites):
+        # uniform grid of TITLE_SIZE cells -> sprites whose hitbox overlaps the cell
+        self.cells = {}
+        self.sprite_cells = {}
+        # sprites join their groups before they set their hitbox, so they are indexed on the next query
+        self.pending = {}
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite)
+        self.pending[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.unindex(sprite)
+        self.pending.pop(sprite, None)
+
+    def refresh(self, sprite):
+        # call after a sprite got a new hitbox
+        if self.has(sprite):
+            self.unindex(sprite)
+            self.pending[sprite] = None
+
+    def get_cells(self, rect):
+        left, top = rect.left // TITLE_SIZE, rect.top // TITLE_SIZE
+        right = max(rect.right - 1, rect.left) // TITLE_SIZE
+        bottom = max(rect.bottom - 1, rect.top) // TITLE_SIZE
+        return [(x, y) for x in range(left, right + 1) for y in range(top, bottom + 1)]
+
+    def index(self, sprite):
+        cells = self.get_cells(sprite.hitbox)
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(sprite)
+        self.sprite_cells[sprite] = cells
+
+    def unindex(self, sprite):
+        for cell in self.sprite_cells.pop(sprite, ()):
+            self.cells[cell].remove(sprite)
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+    def update_index(self):
+        for sprite in self.pending:
+            # sprites without a hitbox (freshly planted seeds) never collide
+            if hasattr(sprite, 'hitbox'):
+                self.index(sprite)
+        self.pending.clear()
+
+    def nearby(self, rect):
+        if self.pending:
+            self.update_index()
+
+        sprites = {}
+        for cell in self.get_cells(rect):
+            for sprite in self.cells.get(cell, ()):
+                sprites[sprite] = None
+        return list(sprites)
@@ -0,0 +1,13 @@
+import weakref
+import pygame
+
+# white flash version of every surface that was harvested or chopped, dropped together with the surface
+silhouettes = weakref.WeakKeyDictionary()
+
+def get_silhouette(surf):
+    if surf not in silhouettes:
+        mask_surf = pygame.mask.from_surface(surf)
+        silhouette = mask_surf.to_surface()
+        silhouette.set_colorkey((0,0,0))
+        silhouettes[surf] = silhouette
+    return silhouettes[surf]
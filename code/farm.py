@@ -0,0 +1,325 @@
+import argparse
+import json
+import random
+import time
+from collections import Counter
+import numpy as np
+from Settings import *
+
+# game rules without graphics or sound: the levels draw this state, python code/farm.py simulates it headless
+
+# soil grid flags
+FARMABLE = np.uint8(1)
+TILLED = np.uint8(2)
+WATERED = np.uint8(4)
+PLANTED = np.uint8(8)
+
+def roll_rain(rng):
+    return rng.randint(0,10) > 7
+
+def sell(owner, item):
+    # owner is anything with an item inventory, a seed inventory and money: the player or a Farmer
+    if owner.item_inventory[item] > 0:
+        owner.item_inventory[item] -= 1
+        owner.money += SALE_PRICES[item]
+        return True
+    return False
+
+def buy(owner, seed):
+    price = PURCHASE_PRICES[seed]
+    if owner.money >= price:
+        owner.seed_inventory[seed] += 1
+        owner.money -= price
+        return True
+    return False
+
+class Farmer:
+    def __init__(self):
+        self.item_inventory = dict(START_ITEMS)
+        self.seed_inventory = dict(START_SEEDS)
+        self.money = START_MONEY
+
+class Crop:
+    def __init__(self, plant_type, age = 0):
+        self.plant_type = plant_type
+        self.grow_speed = GROW_SPEED[plant_type]
+        self.max_age = PLANT_MAX_AGE[plant_type]
+        self.set_age(age)
+
+    def set_age(self, age):
+        self.age = min(age, self.max_age)
+        self.harvestable = self.age >= self.max_age
+
+    def grow(self, days):
+        if days:
+            self.set_age(self.age + self.grow_speed * days)
+
+class Field:
+    def __init__(self, farmable):
+
+        # soil flags by (row, column), crops by (x, y) cell
+        self.grid = np.where(farmable, FARMABLE, 0).astype(np.uint8)
+        self.crops = {}
+        self.raining = False
+
+    def has(self, x, y, flag):
+        rows, cols = self.grid.shape
+        return 0 <= x < cols and 0 <= y < rows and bool(self.grid[y, x] & flag)
+
+    def till(self, x, y):
+        # True when the cell was tilled just now, in the rain it is watered right away
+        if not self.has(x, y, FARMABLE) or self.grid[y, x] & TILLED:
+            return False
+        self.grid[y, x] |= TILLED
+        if self.raining:
+            self.water(x, y)
+        return True
+
+    def water(self, x, y):
+        if not self.has(x, y, TILLED) or self.grid[y, x] & WATERED:
+            return False
+        self.grid[y, x] |= WATERED
+        return True
+
+    def water_all(self):
+        self.grid[(self.grid & TILLED) != 0] |= WATERED
+
+    def dry(self):
+        self.grid &= ~WATERED
+
+    def plant(self, x, y, plant_type):
+        # the new crop, None when the cell isn't tilled or already planted
+        if not self.has(x, y, TILLED) or self.grid[y, x] & PLANTED:
+            return None
+        self.grid[y, x] |= PLANTED
+        self.crops[(x, y)] = Crop(plant_type)
+        return self.crops[(x, y)]
+
+    def harvest(self, x, y):
+        # plant type of a ripe crop, which leaves the field
+        crop = self.crops.get((x, y))
+        if not crop or not crop.harvestable:
+            return None
+        self.grid[y, x] &= ~PLANTED
+        del self.crops[(x, y)]
+        return crop.plant_type
+
+    def grow(self, rainy_days = 0):
+        # rainy_days are later nights of a catch-up, the rain watered every crop on them
+        for (x, y), crop in self.crops.items():
+            crop.grow(rainy_days + bool(self.grid[y, x] & WATERED))
+
+    def get_state(self):
+        return {
+            'grid': self.grid.copy(),
+            'plants': [(x, y, crop.plant_type, crop.age) for (x, y), crop in self.crops.items()]}
+
+    def load_state(self, state):
+        self.grid[:] = state['grid']
+        self.crops = {(x, y): Crop(plant_type, age) for x, y, plant_type, age in state['plants']}
+
+class FruitTree:
+    def __init__(self, name, rng = random):
+        self.rng = rng
+        self.spots = len(APPLE_POS[name])
+        self.health = TREE_HEALTH
+        self.alive = True
+        self.apples = []
+        self.grow_fruit()
+
+    def grow_fruit(self):
+        # the spots that carry an apple today
+        self.apples = [spot for spot in range(self.spots) if self.rng.randint(0,10) < 2]
+
+    def damage(self):
+        # the spot of the apple that fell off, None without apples
+        self.health -= 1
+        if not self.apples:
+            return None
+        spot = self.rng.choice(self.apples)
+        self.apples.remove(spot)
+        return spot
+
+    def fell(self):
+        # True once, when the damage killed the tree
+        if self.alive and self.health <= 0:
+            self.alive = False
+            return True
+        return False
+
+class Farm:
+    def __init__(self, field, trees, rng = random):
+        # everything on a map that changes from day to day
+        self.field = field
+        self.trees = trees
+        self.rng = rng
+        self.raining = roll_rain(rng)
+
+    @property
+    def raining(self):
+        return self.field.raining
+
+    @raining.setter
+    def raining(self, raining):
+        self.field.raining = raining
+
+    def pass_days(self, days):
+        # nights in one go: the first counts the cells that were watered, every later one only the rain
+        rain = [roll_rain(self.rng) for _ in range(days)]
+        self.field.grow(sum(rain[:-1]))
+
+        self.field.dry()
+        self.raining = rain[-1]
+        if self.raining:
+            self.field.water_all()
+
+        # only the last night's apples are left
+        for tree in self.trees:
+            if tree.alive:
+                tree.grow_fruit()
+
+def create_farm(farmable, tree_names, rng = random):
+    # the farm of a map without building its level: its farmable mask and the names of its trees, in map order
+    field = Field(farmable)
+    trees = [FruitTree(name, rng) for name in tree_names]
+    return Farm(field, trees, rng)
+
+class Simulation:
+    def __init__(self, farmable, tree_names, policy, seed, plots):
+        self.rng = random.Random(seed)
+        self.farm = create_farm(farmable, tree_names, self.rng)
+        self.farmer = Farmer()
+        self.policy = POLICIES[policy]
+
+        # the cells the policy farms, the first farmable ones row by row
+        cells = np.argwhere(self.farm.field.grid & FARMABLE)[:plots]
+        self.plots = [(x, y) for y, x in cells.tolist()]
+
+        self.day = 0
+        self.rainy_days = 0
+        self.gathered = Counter()
+        self.sold = Counter()
+        self.bought = Counter()
+        self.planted = Counter()
+        self.income = 0
+        self.spent = 0
+
+    def gather(self, item):
+        self.farmer.item_inventory[item] += 1
+        self.gathered[item] += 1
+
+    def harvest(self):
+        field = self.farm.field
+        for x, y in [cell for cell, crop in field.crops.items() if crop.harvestable]:
+            self.gather(field.harvest(x, y))
+
+    def sell_items(self):
+        for item, amount in self.farmer.item_inventory.items():
+            if amount:
+                for _ in range(amount):
+                    sell(self.farmer, item)
+                self.sold[item] += amount
+                self.income += amount * SALE_PRICES[item]
+
+    def plant(self, cell, seed):
+        field = self.farm.field
+        if not field.has(*cell, TILLED) or field.has(*cell, PLANTED):
+            return
+        if not self.farmer.seed_inventory[seed]:
+            if not buy(self.farmer, seed):
+                return
+            self.bought[seed] += 1
+            self.spent += PURCHASE_PRICES[seed]
+        field.plant(*cell, seed)
+        self.farmer.seed_inventory[seed] -= 1
+        self.planted[seed] += 1
+
+    def chop(self, tree):
+        if tree.damage() is not None:
+            self.gather('apple')
+        if tree.fell():
+            self.gather('wood')
+
+    def run(self, days):
+        for _ in range(days):
+            self.policy(self)
+            # the farmer goes to bed
+            self.farm.pass_days(1)
+            self.day += 1
+            self.rainy_days += self.farm.raining
+
+    def get_stats(self):
+        return {
+            'days': self.day,
+            'money': self.farmer.money,
+            'income': self.income,
+            'spent': self.spent,
+            'profit per day': (self.farmer.money - START_MONEY) / max(self.day, 1),
+            'rainy days': self.rainy_days,
+            'gathered': dict(self.gathered),
+            'sold': dict(self.sold),
+            'seeds bought': dict(self.bought),
+            'seeds planted': dict(self.planted),
+            'crops growing': len(self.farm.field.crops),
+            'trees standing': sum(tree.alive for tree in self.farm.trees)}
+
+# scripted players: each one acts once per day, before going to bed
+
+def grow_crops(sim, seeds):
+    sim.harvest()
+    sim.sell_items()
+    for index, cell in enumerate(sim.plots):
+        sim.farm.field.till(*cell)
+        sim.plant(cell, seeds[index % len(seeds)])
+        sim.farm.field.water(*cell)
+
+def pick_apples(sim):
+    # one hit per tree and day, a tree on its last hit point is spared
+    # trees never heal, so this gathers at most TREE_HEALTH - 1 apples per tree and then only the crops pay
+    for tree in sim.farm.trees:
+        if tree.alive and tree.apples and tree.health > 1:
+            sim.chop(tree)
+
+def chop_trees(sim):
+    for tree in sim.farm.trees:
+        while tree.alive:
+            sim.chop(tree)
+
+POLICIES = {
+    'idle': lambda sim: None,
+    'corn': lambda sim: grow_crops(sim, ['corn']),
+    'tomato': lambda sim: grow_crops(sim, ['tomato']),
+    'mixed': lambda sim: grow_crops(sim, ['corn', 'tomato']),
+    'forager': lambda sim: [grow_crops(sim, ['corn', 'tomato']), pick_apples(sim)],
+    'lumberjack': lambda sim: [grow_crops(sim, ['corn', 'tomato']), chop_trees(sim)],
+}
+
+if __name__ == '__main__':
+    # balancing and soak runs: python code/farm.py --policy mixed --days 10000, from the project folder
+    parser = argparse.ArgumentParser(description = 'Simulate farm days without graphics.')
+    parser.add_argument('--map', default = 'map', choices = list(MAPS))
+    parser.add_argument('--policy', default = 'mixed', choices = list(POLICIES),
+        help = f'forager picks at most {TREE_HEALTH - 1} apples per tree over the whole run, trees never heal')
+    parser.add_argument('--days', type = int, default = 1000)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--plots', type = int, default = 32, help = 'farmable cells the policy tills and plants')
+    parser.add_argument('--json', action = 'store_true', help = 'print the statistics as json')
+    args = parser.parse_args()
+
+    # only the command line reads map files, the rules above never do
+    from mapcache import load_map, get_mask
+    tmx_data = load_map(args.map)
+    tree_names = [obj.name for obj in tmx_data.get_layer_by_name('Trees')]
+    sim = Simulation(get_mask(tmx_data, 'Farmable'), tree_names, args.policy, args.seed, args.plots)
+    start = time.perf_counter()
+    sim.run(args.days)
+    elapsed = time.perf_counter() - start
+
+    stats = sim.get_stats()
+    stats['days per second'] = round(args.days / max(elapsed, 1e-9))
+    if args.json:
+        print(json.dumps(stats, indent = 2))
+    else:
+        print(f'{args.map}, {args.policy}, seed {args.seed}, {args.plots} plots')
+        for name, value in stats.items():
+            print(f'{name:>16}: {value}')
@@ -1,4 +1,7 @@
 from typing import Iterable, Union
+from bisect import bisect_left, bisect_right, insort
+import numpy as np
+from operator import attrgetter
 import pygame
 from pygame.sprite import AbstractGroup
 
@@ -6,84 +9,109 @@ from Settings import *
 from player import Player
 from overlay import Overlay
 from sprites import Generic, Water, WildFlower, Tree, Interaction, Particle
-from pytmx.util_pygame import load_pygame
 from Support import *
 from Transition import Transition
 from soil import SoilLayer
 from sky import Rain, Sky
-from random import randint
+from lighting import PointLight
 from menu import Menu
+from chunks import create_static_layer, bake_ground, get_fence_layer, get_static_layers
+from collision import CollisionGroup
+from farm import Farm
+from assets import assets
+from audio import sound_bank
+from profiler import profiler
+from mapcache import load_map, get_mask
+from world import world_clock
+from Timer import sim_clock, ui_clock
+from loader import asset_loader, get_level_images, get_map_images
+
+sprite_centery = attrgetter('rect.centery')
+
+def merge_rects(rects):
+    # overlapping rects are joined, None when drawing the whole screen is cheaper
+    screen_rect = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+    merged = []
+    for rect in rects:
+        rect = rect.clip(screen_rect)
+        if not rect.width or not rect.height:
+            continue
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    if sum(rect.width * rect.height for rect in merged) > DIRTY_RECTS_MAX_AREA * SCREEN_WIDTH * SCREEN_HEIGHT:
+        return None
+    return merged
 
 class Level:
-    def __init__(self, switch_level, current_map='map', spawn_location='Start', player=None):
+    def __init__(self, switch_level, current_map='map', spawn_location='Start', player=None, tmx_data=None):
 
         #get the display surface
         self.display_surface = pygame.display.get_surface()
         self.switch_level = switch_level
 
         #sprite groups
-        self.collision_sprites = pygame.sprite.Group()
+        self.collision_sprites = CollisionGroup()
         self.tree_sprites = pygame.sprite.Group()
         self.interaction_sprites = pygame.sprite.Group()
         
         self.current_map = current_map
-        if self.current_map == 'map':
-            tmx_data = load_pygame("data/map.tmx")
-            ground_image_path = "graphics/world/ground.png"
-        else:
-            tmx_data = load_pygame("data/map2.tmx")
-            ground_image_path = "graphics/world/ground2.png"
+        # last day this level was simulated
+        self.day = world_clock.day
+        ground_image_path = MAPS[self.current_map][1]
+        # images and sounds are decoded on worker threads while the map is parsed
+        asset_loader.decode(get_level_images(self.current_map), [path for path, *_ in SOUNDS.values()])
+        # the preloader hands over maps it already loaded in the background
+        if tmx_data is None:
+            tmx_data = load_map(self.current_map)
         self.tmx_data = tmx_data
-        
-        self.ground_sprite = Generic(pos=(0,0), surf=pygame.image.load(ground_image_path).convert_alpha(), groups=[], z=LAYERS["ground"])
+        profiler.startup_mark('parse')
+        asset_loader.decode(get_map_images(tmx_data))
+        asset_loader.finish()
+        profiler.startup_mark('decode')
+
+        # maps without a pre-rendered ground image get theirs baked from the tile layers
+        if ground_image_path:
+            ground_surf = assets.image(ground_image_path)
+        else:
+            ground_surf = bake_ground(self.current_map, tmx_data)
+        self.ground_sprite = Generic(pos=(0,0), surf=ground_surf, groups=[], z=LAYERS["ground"])
         self.all_sprites = CameraGroup(self.ground_sprite)
         self.all_sprites.add(self.ground_sprite)
 
-        self.setup(tmx_data, ground_image_path, spawn_location, player)
+        self.setup(tmx_data, ground_surf.get_size(), spawn_location, player)
             
         self.overlay = Overlay(self.player)
         self.transition = Transition(self.reset, self.player)
 
         # sky
-        if self.current_map == 'map':
-            self.rain = Rain(self.all_sprites, "graphics/world/ground.png")
-        else:
-            self.rain = Rain(self.all_sprites, "graphics/world/ground2.png")
-        self.raining = randint(0,10) > 7
-        self.soil_layer.raining = self.raining
-        self.sky = Sky()
+        self.rain = Rain(self.all_sprites, ground_surf.get_size())
+        self.farm = Farm(self.soil_layer.field, [tree.fruit_tree for tree in self.tree_sprites])
+        self.sky = Sky(self.lights)
 
         # shop
         self.menu = Menu(self.player, self.toggle_shop)
         self.shop_active = False
 
-        # music
-        self.success = pygame.mixer.Sound('audio/success.wav')
-        self.success.set_volume(0.3)
-        self.background_sound = pygame.mixer.Sound('audio/bg.mp3')
-        self.background_sound.set_volume(0.2)
-        self.background_sound.play(loops = -1)
+        # dirty rects: set when the next frame has to be drawn in full
+        self.redraw = True
+        self.drawn_stamina = None
+        profiler.startup_mark('sprites')
         
 
-    def setup(self, tmx_data, ground_image_path, spawn_location, player):
-        self.soil_layer = SoilLayer(self.all_sprites, self.collision_sprites, tmx_data, ground_image_path)
+    def setup(self, tmx_data, ground_size, spawn_location, player):
+        self.soil_layer = SoilLayer(self.all_sprites, self.collision_sprites, tmx_data, ground_size)
 
-        #house
-        for layer in ["HouseFloor", "HouseFurnitureBottom"]:
-            for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
-                Generic((x * TITLE_SIZE, y * TITLE_SIZE), surf, self.all_sprites, LAYERS["house bottom"])
+        #house and fence
+        fence_layer = get_fence_layer(tmx_data)
+        for layer_names, z in get_static_layers(tmx_data):
+            create_static_layer(self.current_map, tmx_data, layer_names, self.all_sprites, z)
 
-        for layer in ["HouseWalls", "HouseFurnitureTop"]:
-            for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
-                Generic((x * TITLE_SIZE, y * TITLE_SIZE), surf, self.all_sprites, LAYERS["main"])
-
-        #fence
-        try:
-            for x, y, surf in tmx_data.get_layer_by_name("Fence").tiles():
-                Generic((x * TITLE_SIZE, y * TITLE_SIZE), surf, [self.all_sprites, self.collision_sprites])
-        except ValueError:
-            for x, y, surf in tmx_data.get_layer_by_name("Fences").tiles():
-                Generic((x * TITLE_SIZE, y * TITLE_SIZE), surf, [self.all_sprites, self.collision_sprites])
+        #fence collision
+        for x, y, surf in tmx_data.get_layer_by_name(fence_layer).tiles():
+            Generic((x * TITLE_SIZE, y * TITLE_SIZE), surf, self.collision_sprites)
 
         #water
         water_frames = import_folder("graphics/water")
@@ -103,16 +131,24 @@ class Level:
         for obj in tmx_data.get_layer_by_name("Decoration"):
             WildFlower((obj.x, obj.y), obj.image, [self.all_sprites, self.collision_sprites])
 
-        #collision tiles
-        try:
-            for x, y, surf in tmx_data.get_layer_by_name("Collision").tiles():
-                Generic((x * TITLE_SIZE, y * TITLE_SIZE), pygame.Surface((TITLE_SIZE, TITLE_SIZE)), self.collision_sprites)
-        except ValueError:
-            for x, y, surf in tmx_data.get_layer_by_name("Collision2").tiles():
-                Generic((x * TITLE_SIZE, y * TITLE_SIZE), pygame.Surface((TITLE_SIZE, TITLE_SIZE)), self.collision_sprites)
+        #collision tiles, they are never drawn so they all share one surface
+        collision_layer = "Collision" if "Collision" in tmx_data.layernames else "Collision2"
+        collision_surf = pygame.Surface((TITLE_SIZE, TITLE_SIZE))
+        for y, x in np.argwhere(get_mask(tmx_data, collision_layer)).tolist():
+            Generic((x * TITLE_SIZE, y * TITLE_SIZE), collision_surf, self.collision_sprites)
+
+        # lamps, from the light layer and from objects that glow at night
+        self.lights = []
+        if "Lights" in tmx_data.layernames:
+            for obj in tmx_data.get_layer_by_name("Lights"):
+                self.lights.append(PointLight((obj.x + obj.width / 2, obj.y + obj.height / 2), int(max(obj.width, obj.height) / 2), LIGHT_COLOR))
+        for obj in tmx_data.get_layer_by_name("Player"):
+            if obj.name in LIGHT_SOURCES:
+                radius, color = LIGHT_SOURCES[obj.name]
+                self.lights.append(PointLight((obj.x + obj.width / 2, obj.y + obj.height / 2), radius, color))
 
-        # Player and Interaction objects
-        player_spawn_pos = None
+        # Player and Interaction objects, a loaded game spawns at its saved position
+        player_spawn_pos = spawn_location if isinstance(spawn_location, tuple) else None
         for obj in tmx_data.get_layer_by_name("Player"):
             if obj.name == spawn_location:
                 player_spawn_pos = (obj.x, obj.y)
@@ -120,7 +156,7 @@ class Level:
                 Interaction((obj.x,obj.y), (obj.width,obj.height), self.interaction_sprites, obj.name)
             if obj.name == "Trader":
                 Interaction((obj.x,obj.y), (obj.width,obj.height), self.interaction_sprites, obj.name)
-            if obj.name in ('Map1', 'Map2'):
+            if obj.name in MAP_EXITS:
                 Interaction((obj.x,obj.y), (obj.width,obj.height), self.interaction_sprites, obj.name)
 
         if player:
@@ -134,6 +170,7 @@ class Level:
             if player_spawn_pos:
                 self.player.pos.x = player_spawn_pos[0]
                 self.player.pos.y = player_spawn_pos[1]
+                self.player.old_pos.update(self.player.pos)
         else:
             if player_spawn_pos:
                 self.player = Player(
@@ -144,84 +181,147 @@ class Level:
                     interaction=self.interaction_sprites,
                     soil_layer=self.soil_layer,
                     toggle_shop=self.toggle_shop)
-        
+
+        self.collision_sprites.update_index()
+
+    def get_size(self):
+        # rough memory footprint: every distinct surface the level draws, the ground included
+        surfs = {id(sprite.image): sprite.image for sprite in self.all_sprites}
+        return sum(surf.get_pitch() * surf.get_height() for surf in surfs.values())
+
+    def get_state(self):
+        # all that is kept of a level that got evicted from the level cache
+        return {
+            'soil': self.soil_layer.get_state(),
+            'trees': [tree.get_state() for tree in self.tree_sprites],
+            'raining': self.farm.raining,
+            'day': self.day}
+
+    def load_state(self, state):
+        self.soil_layer.load_state(state['soil'])
+
+        # trees are created in map order, so they line up with the saved list
+        for tree, tree_state in zip(self.tree_sprites, state['trees']):
+            tree.load_state(tree_state)
+
+        self.farm.raining = state['raining']
+        self.day = state['day']
+
     def player_add(self,item):
 
         self.player.item_inventory[item] += 1
-        self.success.play()
+        sound_bank.play('success')
 
     def toggle_shop(self):
         self.shop_active = not self.shop_active
+        sim_clock.paused = self.shop_active
+        self.redraw = True
 
     def reset(self):
-        # plants
-        self.soil_layer.update_plants()
-
-        #soil
-        self.soil_layer.remove_water()
-        self.raining = randint(0,10) > 7
-        self.soil_layer.raining = self.raining
-        if self.raining:
-            self.soil_layer.water_all()
-
-        # apples on the trees
+        world_clock.next_day()
+        self.catch_up()
+
+    def catch_up(self):
+        # levels the player wasn't in missed some nights, they are simulated in one go
+        days = world_clock.day - self.day
+        if days <= 0:
+            return
+        self.day = world_clock.day
+        self.farm.pass_days(days)
+
+        # the sprites show the new day
+        self.soil_layer.refresh()
         for tree in self.tree_sprites.sprites():
-            if tree.alive:
-                for apple in tree.apple_sprites.sprites():
-                    apple.kill()
-                tree.create_fruit()
+            if tree.fruit_tree.alive:
+                tree.create_apples()
 
         # sky
-        self.sky.start_color = [255,255,255]
+        self.sky.reset()
 
     def plant_collision(self):
-        if self.soil_layer.plant_sprites:
-            for plant in self.soil_layer.plant_sprites.sprites():
-                if plant.harvestable and plant.rect.colliderect(self.player.hitbox):
-                    self.player_add(plant.plant_type)
-                    plant.kill()
-                    Particle(
-                        pos = plant.rect.topleft, 
-                        surf = plant.image, 
-                        groups = self.all_sprites, 
-                        z = LAYERS['main'])
-                    self.soil_layer.grid[plant.rect.centery // TITLE_SIZE][plant.rect.centerx // TITLE_SIZE].remove('P')
+        for plant in self.soil_layer.get_plants(self.player.hitbox):
+            if plant.crop.harvestable and plant.rect.colliderect(self.player.hitbox):
+                self.player_add(self.soil_layer.harvest(plant))
+                Particle(
+                    pos = plant.rect.topleft, 
+                    surf = plant.image, 
+                    groups = self.all_sprites, 
+                    z = LAYERS['main'])
 
     def check_transition(self):
         for sprite in self.interaction_sprites:
-            if sprite.rect.colliderect(self.player.hitbox):
-                if sprite.name == 'Map2':
-                    self.switch_level('map2', 'Spawn2')
-                elif sprite.name == 'Map1':
-                    self.switch_level('map', 'Spawn1')
+            if sprite.name in MAP_EXITS and sprite.rect.colliderect(self.player.hitbox):
+                self.switch_level(*MAP_EXITS[sprite.name])
 
 
-    def run(self,dt):
-        # drawing logic
-        self.display_surface.fill("black")
-        self.all_sprites.custom_draw(self.player)
+    def update(self, dt):
+        # timers and lifetimes that ran out, the simulation clock is paused while the shop is open
+        ui_clock.update(dt)
+        sim_clock.update(dt)
+        profiler.mark('timers')
 
-        # updates
         if self.shop_active:
             self.menu.update()
+            profiler.mark('menu')
         else:
             self.all_sprites.update(dt)
+            profiler.mark('sprites update')
             self.plant_collision()
-        
+            profiler.mark('plant collision')
+
         # weather
-        self.overlay.display()
-        if self.raining and not self.shop_active:
-            self.rain.update()
-        self.sky.display(dt)
+        if not self.shop_active:
+            self.rain.update(dt, self.farm.raining)
+            profiler.mark('rain')
+        self.sky.update(dt)
 
         # transition overlay
         if self.player.sleep:
-            self.transition.play()
+            self.transition.update()
+        profiler.mark('sky and transition')
 
         self.check_transition()
+        profiler.mark('check transition')
+
+    def get_ui_rects(self):
+        # ui that changed since the last frame
+        rects = self.overlay.refresh()
+        if self.shop_active:
+            rects += self.menu.refresh()
+        if self.player.stamina != self.drawn_stamina:
+            self.drawn_stamina = self.player.stamina
+            rects.append(self.player.get_stamina_bar_rect())
+        return rects
+
+    def draw(self, alpha = 1, redraw = True):
+        # alpha is how far the frame lies between the last and the next simulation step
+        # redraw: the screen doesn't show the last frame of this level
+        # returns the parts of the screen that changed, None when all of it was drawn
+        redraw = redraw or self.redraw
+        self.redraw = False
+        if DIRTY_RECTS and not redraw:
+            # full screen effects change every pixel
+            self.all_sprites.update_camera(self.player, alpha)
+            redraw = self.player.sleep or self.sky.changed(self.all_sprites.offset)
+        rects = self.all_sprites.custom_draw(self.player, alpha, redraw, self.get_ui_rects())
+        profiler.mark('draw')
 
-        #print(self.player.item_inventory)
-        #print(self.shop_active)
+        if self.shop_active:
+            self.menu.display(rects)
+        self.overlay.display(rects)
+        profiler.mark('ui')
+        self.sky.display(self.all_sprites.offset, rects)
+        profiler.mark('sky display')
+
+        if self.player.sleep:
+            self.transition.display()
+            self.redraw = True
+            profiler.mark('transition display')
+        return rects
+
+    def run(self,dt):
+        self.update(dt)
+        self.draw()
 
 class CameraGroup(pygame.sprite.Group):
     def __init__(self, ground_sprite):
@@ -230,28 +330,141 @@ class CameraGroup(pygame.sprite.Group):
         self.offset = pygame.math.Vector2()
         self.ground_sprite = ground_sprite
 
-    def custom_draw(self, player):
-        self.offset.x = player.rect.centerx - SCREEN_WIDTH / 2
-        self.offset.y = player.rect.centery - SCREEN_HEIGHT / 2
+        # draw list: one bucket per layer, kept sorted by centery
+        self.layers = {layer: [] for layer in sorted(LAYERS.values())}
+        self.sprite_layers = {}
+        # half the height of the tallest sprite a bucket ever held, how far its sprites reach past the camera
+        self.reaches = {layer: 0 for layer in self.layers}
+        # sprites join their groups before they set their z, so they are bucketed on the next draw
+        self.pending = []
+
+        # non-sprite renderers (rain) drawn on top of the sprites of a layer
+        self.effects = {}
+
+        # dirty rects: image and screen rect of every sprite in the last frame, in draw order
+        self.drawn = {}
+        self.drawn_offset = None
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite)
+        self.pending.append(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        if sprite in self.sprite_layers:
+            self.layers[self.sprite_layers.pop(sprite)].remove(sprite)
+        else:
+            self.pending.remove(sprite)
+
+    def bucket(self, sprite):
+        self.sprite_layers[sprite] = sprite.z
+        self.reaches[sprite.z] = max(self.reaches[sprite.z], sprite.rect.height // 2 + 1)
+
+    def add_pending(self):
+        layers = set()
+        for sprite in self.pending:
+            self.layers[sprite.z].append(sprite)
+            self.bucket(sprite)
+            layers.add(sprite.z)
+        for layer in layers:
+            self.layers[layer].sort(key = sprite_centery)
+        self.pending.clear()
+
+    def refresh(self, sprite):
+        # call after a sprite moved, got a taller image or a new z, only that sprite is sorted in again
+        if sprite in self.sprite_layers:
+            self.layers[self.sprite_layers[sprite]].remove(sprite)
+            insort(self.layers[sprite.z], sprite, key = sprite_centery)
+            self.bucket(sprite)
+
+    def add_effect(self, layer, effect):
+        self.effects.setdefault(layer, []).append(effect)
+
+    def visible_sprites(self, camera_rect):
+        if self.pending:
+            self.add_pending()
+
+        # only the sprites between the camera edges (and the reach of the tallest one) are looked at
+        visible = {}
+        for layer, bucket in self.layers.items():
+            reach = self.reaches[layer]
+            start = bisect_left(bucket, camera_rect.top - reach, key = sprite_centery)
+            end = bisect_right(bucket, camera_rect.bottom + reach, key = sprite_centery)
+            visible[layer] = [sprite for sprite in bucket[start:end] if camera_rect.colliderect(sprite.rect)]
+        return visible
+
+    def update_camera(self, player, alpha = 1):
+        # the player is drawn between its last two simulated positions, the camera follows that
+        player_rect = player.rect.move(
+            round((player.old_pos.x - player.pos.x) * (1 - alpha)),
+            round((player.old_pos.y - player.pos.y) * (1 - alpha)))
+
+        self.offset.x = player_rect.centerx - SCREEN_WIDTH / 2
+        self.offset.y = player_rect.centery - SCREEN_HEIGHT / 2
 
         # Clamp the offset to the map boundaries
         self.offset.x = max(0, min(self.offset.x, self.ground_sprite.rect.width - SCREEN_WIDTH))
         self.offset.y = max(0, min(self.offset.y, self.ground_sprite.rect.height - SCREEN_HEIGHT))
 
-        for layer in LAYERS.values():
-            for sprite in sorted(self.sprites(), key=lambda sprite: sprite.rect.centery):
-                if sprite.z == layer:
-                    offset_rect = sprite.rect.copy()
-                    offset_rect.center -= self.offset
-                    self.display_surface.blit(sprite.image, offset_rect)
-
-                    # analytics
-                    #if sprite == player:
-                    #    pygame.draw.rect(self.display_surface, 'red',offset_rect,4)
-                    #    hitbox_rect = player.hitbox.copy()
-                    #    hitbox_rect.center = offset_rect.center
-                    #    pygame.draw.rect(self.display_surface, 'green', hitbox_rect,5)
-                    #    target_pos = offset_rect.center + PLAYER_TOOL_OFFSET[player.status.split('_')[0]]
-                    #    pygame.draw.circle(self.display_surface,'blue', target_pos,5)
-
-        player.draw_stamina_bar(self.display_surface)
+        return player_rect, pygame.Rect(self.offset.x, self.offset.y, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    def get_dirty_rects(self, visible, camera_rect, redraw, extra_rects):
+        offset_x, offset_y = camera_rect.topleft
+        drawn = {sprite: (sprite.image, sprite.rect.move(-offset_x, -offset_y)) for sprites in visible.values() for sprite in sprites}
+        last_drawn, last_offset = self.drawn, self.drawn_offset
+        self.drawn, self.drawn_offset = drawn, camera_rect.topleft
+
+        # a moving camera changes every pixel, and effects like rain are spread over the whole screen
+        if redraw or camera_rect.topleft != last_offset or any(effect.count for effects in self.effects.values() for effect in effects):
+            return None
+
+        # sprites that moved, changed their image, appeared or went away
+        rects = list(extra_rects)
+        for sprite, (image, rect) in drawn.items():
+            last = last_drawn.pop(sprite, None)
+            if last is None:
+                rects.append(rect)
+            elif last[0] is not image or last[1] != rect:
+                rects.append(rect)
+                rects.append(last[1])
+        rects.extend(rect for _, rect in last_drawn.values())
+        return merge_rects(rects)
+
+    def draw_rects(self, rects, player):
+        sprites = list(self.drawn)
+        screen_rects = [rect for _, rect in self.drawn.values()]
+        stamina_bar_rect = player.get_stamina_bar_rect()
+        for rect in rects:
+            self.display_surface.set_clip(rect)
+            self.display_surface.fill("black", rect)
+            self.display_surface.blits([(sprites[index].image, screen_rects[index]) for index in rect.collidelistall(screen_rects)], False)
+            if rect.colliderect(stamina_bar_rect):
+                player.draw_stamina_bar(self.display_surface)
+        self.display_surface.set_clip(None)
+
+    def custom_draw(self, player, alpha = 1, redraw = True, extra_rects = ()):
+        # returns the parts of the screen that were drawn, None when all of it was
+        player_rect, camera_rect = self.update_camera(player, alpha)
+        offset_x, offset_y = camera_rect.topleft
+
+        # draw the player between its last two simulated positions
+        player_rect, player.rect = player.rect, player_rect
+        self.refresh(player)
+        visible = self.visible_sprites(camera_rect)
+        rects = self.get_dirty_rects(visible, camera_rect, redraw, extra_rects) if DIRTY_RECTS else None
+
+        if rects is not None:
+            self.draw_rects(rects, player)
+        else:
+            self.display_surface.fill("black")
+            for layer, sprites in visible.items():
+                if sprites:
+                    self.display_surface.blits(
+                        [(sprite.image, (sprite.rect.x - offset_x, sprite.rect.y - offset_y)) for sprite in sprites],
+                        False)
+                for effect in self.effects.get(layer, ()):
+                    effect.draw(self.display_surface, camera_rect, alpha)
+            player.draw_stamina_bar(self.display_surface)
+
+        player.rect = player_rect
+        return rects
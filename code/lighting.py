@@ -0,0 +1,90 @@
+import numpy as np
+import pygame
+from Settings import *
+
+WHITE = (255, 255, 255)
+
+def get_sky_colors(end_color):
+    # colour of every day phase, each channel drops one unit per phase until it reaches end_color
+    phases = 255 - min(end_color) + 1
+    return [tuple(max(255 - phase, value) for value in end_color) for phase in range(phases)]
+
+def create_glow(radius, color, strength):
+    # radial gradient for an additive blit, bright in the center and black at the radius
+    distance = np.hypot(*np.ogrid[-radius:radius, -radius:radius]) / radius
+    falloff = np.clip(1 - distance, 0, 1) ** 2 * strength
+    pixels = (falloff[..., None] * np.array(color)).astype(np.uint8)
+    return pygame.surfarray.make_surface(pixels)
+
+class PointLight:
+    def __init__(self, pos, radius, color):
+        self.pos = pygame.math.Vector2(pos)
+        self.radius = radius
+        self.color = color
+        self.rect = pygame.Rect(0, 0, radius * 2, radius * 2)
+        self.rect.center = pos
+
+class Lighting:
+    def __init__(self, lights = ()):
+        self.display_surface = pygame.display.get_surface()
+        self.lights = list(lights)
+
+        # light map, at a fraction of the screen resolution when LIGHTING_SCALE > 1
+        self.scale = LIGHTING_SCALE
+        self.light_map = pygame.Surface((SCREEN_WIDTH // self.scale, SCREEN_HEIGHT // self.scale))
+        self.tint_surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)) if self.scale > 1 else self.light_map
+
+        # the light map is only rebuilt when its inputs change
+        self.key = None
+        self.active = False
+        self.glows = {}
+
+    def get_glow(self, light, strength):
+        key = (light.radius, light.color, strength)
+        if key not in self.glows:
+            self.glows[key] = create_glow(light.radius // self.scale, light.color, strength / LIGHT_LEVELS)
+        return self.glows[key]
+
+    def get_visible_lights(self, camera_rect, ambient):
+        # lights fade in as the sky gets darker
+        darkness = 1 - sum(ambient) / (3 * 255)
+        strength = round(darkness * LIGHT_LEVELS)
+        if not strength:
+            return []
+        return [(light, strength) for light in self.lights if camera_rect.colliderect(light.rect)]
+
+    def build(self, ambient, offset, visible):
+        self.light_map.fill(ambient)
+        for light, strength in visible:
+            pos = ((light.rect.left - offset[0]) // self.scale, (light.rect.top - offset[1]) // self.scale)
+            self.light_map.blit(self.get_glow(light, strength), pos, special_flags = pygame.BLEND_RGB_ADD)
+        if self.scale > 1:
+            pygame.transform.smoothscale(self.light_map, self.tint_surf.get_size(), self.tint_surf)
+
+    def update(self, ambient, offset = (0, 0)):
+        # returns True when the tint changed, the whole screen has to be tinted again then
+        offset = (int(offset[0]), int(offset[1]))
+        camera_rect = pygame.Rect(offset, (SCREEN_WIDTH, SCREEN_HEIGHT))
+        visible = self.get_visible_lights(camera_rect, ambient)
+
+        # without lights in view the camera position doesn't matter
+        key = (ambient, offset if visible else None, tuple(strength for _, strength in visible))
+        if key == self.key:
+            return False
+        self.key = key
+        # multiplying by white changes nothing
+        self.active = ambient != WHITE or bool(visible)
+        if self.active:
+            self.build(ambient, offset, visible)
+        return True
+
+    def display(self, ambient, offset = (0, 0), rects = None):
+        self.update(ambient, offset)
+        if not self.active:
+            return
+        if rects is None:
+            self.display_surface.blit(self.tint_surf, (0, 0), special_flags = pygame.BLEND_RGB_MULT)
+            return
+        # the rest of the screen is still tinted from the last frame
+        for rect in rects:
+            self.display_surface.blit(self.tint_surf, rect, rect, special_flags = pygame.BLEND_RGB_MULT)
@@ -0,0 +1,54 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter_ns
+import pygame
+from Settings import *
+from assets import assets
+from atlas import atlas
+from profiler import profiler
+
+def get_level_images(map_name):
+    # known before the map is parsed: the ground and the atlas pages
+    ground_image_path = MAPS[map_name][1]
+    return ([ground_image_path] if ground_image_path else []) + atlas.get_pages()
+
+def get_map_images(tmx_data):
+    # tilesets of a compiled map, a map pytmx loaded has its images already
+    return getattr(tmx_data, 'files', [])
+
+def timed(load, path):
+    start = perf_counter_ns()
+    asset = load(path)
+    profiler.startup_span(f'decode {os.path.basename(path)}', start, perf_counter_ns(), threading.current_thread().name)
+    return asset
+
+class AssetLoader:
+    def __init__(self):
+
+        # pygame lets go of the GIL while it decodes, so the workers run next to the main thread
+        self.pool = None
+        self.images = {}
+        self.sounds = {}
+
+    def decode(self, images = (), sounds = ()):
+        # starts reading and decoding everything that isn't cached yet
+        if not self.pool:
+            self.pool = ThreadPoolExecutor(ASSET_DECODE_THREADS, thread_name_prefix = 'decode')
+        for path in images:
+            if path not in self.images and not assets.has('image', path):
+                self.images[path] = self.pool.submit(timed, pygame.image.load, path)
+        for path in sounds:
+            if path not in self.sounds and not assets.has('sound', path):
+                self.sounds[path] = self.pool.submit(timed, pygame.mixer.Sound, path)
+
+    def finish(self):
+        # converting needs the display, it is done here on the main thread
+        for path, job in self.images.items():
+            assets.image(path, job.result())
+        for path, job in self.sounds.items():
+            assets.sound(path, job.result())
+        self.images.clear()
+        self.sounds.clear()
+
+asset_loader = AssetLoader()
@@ -1,31 +1,124 @@
-import pygame, sys
+import time
+# startup trace, the imports are timed from here
+started = time.perf_counter_ns()
+import pygame, sys, traceback
+from collections import OrderedDict
 from Settings import *
 from level import Level
+from chunks import release_map
+from assets import assets
+from audio import music
+from profiler import profiler
+from preload import preloader
+from save import saver, SAVE_ERRORS
+from world import world_clock
+from Transition import LoadingFade
 
 class Game:
     def __init__(self):
+        profiler.begin_startup(started)
+        profiler.startup_mark('import')
         pygame.init()
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SCALED if VSYNC else 0, vsync = int(VSYNC))
         pygame.display.set_caption("Spaza Valley")
+        profiler.startup_mark('init')
         self.clock = pygame.time.Clock()
-        self.levels = {}
+        self.focused = True
+        # dirty rects: the next frame is drawn in full
+        self.redraw = True
+
+        # built levels, least recently visited first, and the state of the evicted ones
+        self.levels = OrderedDict()
+        self.dormant_levels = {}
         
+        # continue the saved game, if there is one
+        save = saver.load()
+        profiler.startup_mark('load save')
+
         # Create the first level and cache it
-        first_level = Level(self.switch_level, 'map', 'Start')
-        self.levels['map'] = first_level
+        first_level = None
+        if save:
+            try:
+                first_level = self.continue_game(save)
+            except SAVE_ERRORS:
+                # a save this version of the game can't apply, a new game replaces it
+                traceback.print_exc()
+                world_clock.day = 0
+                self.dormant_levels.clear()
+                saver.discard()
+        if not first_level:
+            first_level = Level(self.switch_level, 'map', 'Start')
+        start_map = first_level.current_map
+        self.levels[start_map] = first_level
         self.level = first_level
+        self.saved_day = world_clock.day
+
+        # maps the player can walk to next are parsed in the background
+        self.loading = None
+        self.loading_fade = LoadingFade()
+        self.preload_neighbours()
+        music.play(MAP_MUSIC.get(start_map))
+        profiler.startup_mark('sprites')
+
+    def continue_game(self, save):
+        if save['map'] not in MAPS:
+            raise KeyError(f"unknown map {save['map']!r} in the save")
+        world_clock.day = save['day']
+        self.dormant_levels.update(save['levels'])
+        level = Level(self.switch_level, save['map'], tuple(save['pos']))
+        self.restore_level(level)
+        level.player.load_state(save['player'])
+        return level
+
+    def restore_level(self, level):
+        state = self.dormant_levels.pop(level.current_map, None)
+        if state is None:
+            return
+        # a map that was resized since the save starts with a new farm
+        if state['soil']['grid'].shape != level.soil_layer.field.grid.shape:
+            print(f'{level.current_map} changed size since it was saved, its farm starts over')
+            return
+        level.load_state(state)
+        level.catch_up()
+
+    def preload_neighbours(self):
+        for map_name in MAP_NEIGHBOURS.get(self.level.current_map, ()):
+            if map_name not in self.levels:
+                preloader.request(map_name)
 
     def switch_level(self, new_map, spawn_location):
+        if new_map in self.levels or preloader.ready(new_map):
+            self.enter_level(new_map, spawn_location)
+        else:
+            # the preloader isn't done yet, fade out until it is
+            preloader.request(new_map, urgent = True)
+            self.loading = (new_map, spawn_location)
+            self.loading_fade.start()
+
+    def update_loading(self):
+        new_map, spawn_location = self.loading
+        if preloader.ready(new_map):
+            self.loading = None
+            self.enter_level(new_map, spawn_location)
+
+    def enter_level(self, new_map, spawn_location):
         player = self.level.player # Get player from the current level
+        self.redraw = True
+        music.play(MAP_MUSIC.get(new_map))
         
         if new_map in self.levels:
             # The level is already cached, just switch to it
             self.level = self.levels[new_map]
+            self.levels.move_to_end(new_map)
+            self.level.catch_up()
         else:
-            # Create the new level and cache it
-            new_level_instance = Level(self.switch_level, new_map, spawn_location, player)
+            # Create the new level from the preloaded map and cache it
+            new_level_instance = Level(self.switch_level, new_map, spawn_location, player, preloader.take(new_map))
+            self.restore_level(new_level_instance)
             self.levels[new_map] = new_level_instance
             self.level = new_level_instance
+            self.evict_levels()
+            self.preload_neighbours()
             return # The setup for the new level already places the player correctly
 
         # If we are switching to an *existing* level, we need to manually place the player
@@ -41,18 +134,106 @@ class Game:
             if obj.name == spawn_location:
                 self.level.player.pos.x = obj.x
                 self.level.player.pos.y = obj.y
+                self.level.player.old_pos.update(self.level.player.pos)
                 break
 
+    def evict_levels(self, budget = LEVEL_CACHE_BYTES):
+        sizes = {map_name: level.get_size() for map_name, level in self.levels.items()}
+        while len(self.levels) > 1 and sum(sizes.values()) > budget:
+            map_name, level = self.levels.popitem(last = False)
+            del sizes[map_name]
+            self.dormant_levels[map_name] = level.get_state()
+
+            # the baked chunks and the ground go with the level, the preloader brings them back
+            release_map(map_name)
+            if MAPS[map_name][1]:
+                assets.discard('image', MAPS[map_name][1])
+
+    def get_snapshot(self):
+        # dormant states are never changed, so they are shared, the resident levels copy theirs
+        levels = dict(self.dormant_levels)
+        for map_name, level in self.levels.items():
+            levels[map_name] = level.get_state()
+
+        player = self.level.player
+        return {
+            'day': world_clock.day,
+            'map': self.level.current_map,
+            'pos': (player.pos.x, player.pos.y),
+            'player': player.get_state(),
+            'levels': levels}
+
+    def autosave(self):
+        # the writer thread diffs, compresses and writes it
+        self.saved_day = world_clock.day
+        saver.save(self.get_snapshot())
+
+    def get_frame_rate(self):
+        if THROTTLE_UNFOCUSED and not self.focused:
+            return UNFOCUSED_FRAME_RATE
+        return FRAME_RATE
+
     def run(self):
+        step = 1 / TICK_RATE
+        accumulator = 0
+        self.clock.tick()
         while True:
+            profiler.begin_frame()
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    if profiler.recording:
+                        profiler.toggle_recording()
+                    self.autosave()
+                    saver.flush()
                     pygame.quit()
                     sys.exit()
+                if event.type == pygame.WINDOWFOCUSLOST:
+                    self.focused = False
+                if event.type == pygame.WINDOWFOCUSGAINED:
+                    self.focused = True
+                if event.type == pygame.WINDOWEXPOSED:
+                    self.redraw = True
+                if event.type == pygame.KEYDOWN and event.key == PROFILER_HUD_KEY:
+                    profiler.toggle_hud()
+                if event.type == pygame.KEYDOWN and event.key == PROFILER_RECORD_KEY:
+                    profiler.toggle_recording()
+            profiler.mark('events')
+
+            # fixed rate simulation, rendering runs as fast as the frame cap allows
+            frame_time = min(self.clock.tick(self.get_frame_rate()) / 1000, MAX_FRAME_TIME)
+            accumulator += frame_time
+            profiler.mark('wait')
+            music.update(frame_time)
+            while accumulator >= step:
+                if self.loading:
+                    self.loading_fade.update(step)
+                else:
+                    self.level.update(step)
+                accumulator -= step
+            if self.loading:
+                self.update_loading()
+
+            # a new day started, usually the player just slept
+            if world_clock.day != self.saved_day:
+                self.autosave()
 
-            dt = self.clock.tick() / 1000
-            self.level.run(dt)
-            pygame.display.update()
+            rects = self.level.draw(accumulator / step, self.redraw)
+            self.redraw = False
+            # overlays over the whole screen, the level draws all of it again on the next frame
+            if self.loading or profiler.show_hud:
+                rects = None
+                self.redraw = True
+            if self.loading:
+                self.loading_fade.display(preloader.get_progress(self.loading[0]))
+            profiler.display(self.screen, self.level)
+            profiler.mark('profiler')
+            if rects is None:
+                pygame.display.update()
+            else:
+                pygame.display.update(rects)
+            profiler.end_startup()
+            profiler.mark('present')
+            profiler.end_frame()
 
 if __name__ == "__main__":
     game = Game()
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+import threading
+import xml.etree.ElementTree as ElementTree
+import numpy as np
+import pygame
+from pytmx import TiledMap, TiledTileLayer, TiledObjectGroup, TileFlags
+from pytmx.util_pygame import load_pygame, handle_transformation, smart_convert
+from Settings import *
+from assets import assets
+
+# bump when the artifact layout changes, older artifacts are recompiled
+MAP_CACHE_VERSION = 1
+
+# tile layers that are also stored as bitmaps
+MASK_LAYERS = ['Farmable', 'Collision', 'Collision2']
+
+OBJECT_RECORD = np.dtype([
+    ('layer', np.uint16), ('id', np.uint32), ('name', np.uint32), ('type', np.uint32),
+    ('x', np.float64), ('y', np.float64), ('width', np.float64), ('height', np.float64),
+    ('gid', np.uint32)])
+
+def get_cache_paths(tmx_path):
+    stem = os.path.join(MAP_CACHE_DIR, os.path.splitext(os.path.basename(tmx_path))[0])
+    return {
+        'meta': stem + '.json',
+        'tiles': stem + '.tiles.npy',
+        'objects': stem + '.objects.npy',
+        'masks': stem + '.masks.npy'}
+
+def get_sources(tmx_path):
+    # the map and the external tilesets it references
+    sources = [tmx_path]
+    for tileset in ElementTree.parse(tmx_path).getroot().iter('tileset'):
+        if tileset.get('source'):
+            sources.append(os.path.normpath(os.path.join(os.path.dirname(tmx_path), tileset.get('source'))))
+    return sources
+
+def get_stamps(sources):
+    return [[path, os.stat(path).st_mtime_ns, os.stat(path).st_size] for path in sources]
+
+def get_hash(sources):
+    digest = hashlib.sha1(str(MAP_CACHE_VERSION).encode())
+    for path in sources:
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+def record_image_loader(filename, colorkey, **kwargs):
+    # remembers where every tile image comes from instead of loading it
+    def load(rect = None, flags = None):
+        return os.path.normpath(filename), colorkey, rect, flags
+    return load
+
+def save_array(path, array):
+    with open(path + '.tmp', 'wb') as file:
+        np.save(file, array)
+    os.replace(path + '.tmp', path)
+
+def save_json(path, data):
+    with open(path + '.tmp', 'w') as file:
+        json.dump(data, file)
+    os.replace(path + '.tmp', path)
+
+def compile_map(tmx_path):
+    sources = get_sources(tmx_path)
+    tmx_data = TiledMap(tmx_path, image_loader = record_image_loader)
+    paths = get_cache_paths(tmx_path)
+    os.makedirs(MAP_CACHE_DIR, exist_ok = True)
+
+    # image table, indexed by gid
+    files, images = [], []
+    for image in tmx_data.images:
+        if image is None:
+            images.append(None)
+            continue
+        filename, colorkey, rect, flags = image
+        if filename not in files:
+            files.append(filename)
+        images.append([
+            files.index(filename),
+            colorkey,
+            list(rect) if rect else None,
+            list(flags) if flags else None])
+
+    # tile layers stacked into one gid array, object layers as records
+    strings = [None]
+    def string_index(value):
+        if value not in strings:
+            strings.append(value)
+        return strings.index(value)
+
+    layers, tile_layers, masks, mask_names, records = [], [], [], [], []
+    for index, layer in enumerate(tmx_data.layers):
+        if isinstance(layer, TiledTileLayer):
+            data = np.array(layer.data, np.uint32)
+            layers.append({'name': layer.name, 'kind': 'tiles', 'index': len(tile_layers)})
+            tile_layers.append(data)
+            if layer.name in MASK_LAYERS:
+                mask_names.append(layer.name)
+                masks.append(np.packbits(data != 0, axis = 1))
+        elif isinstance(layer, TiledObjectGroup):
+            layers.append({'name': layer.name, 'kind': 'objects'})
+            for obj in layer:
+                records.append((
+                    index, obj.id, string_index(obj.name), string_index(obj.type),
+                    obj.x, obj.y, obj.width, obj.height, obj.gid))
+
+    shape = (tmx_data.height, tmx_data.width)
+    save_array(paths['tiles'], np.stack(tile_layers) if tile_layers else np.zeros((0, *shape), np.uint32))
+    save_array(paths['objects'], np.array(records, OBJECT_RECORD))
+    save_array(paths['masks'], np.stack(masks) if masks else np.zeros((0, shape[0], (shape[1] + 7) // 8), np.uint8))
+
+    # the metadata goes last, an artifact without it is never read
+    save_json(paths['meta'], {
+        'version': MAP_CACHE_VERSION,
+        'sources': get_stamps(sources),
+        'hash': get_hash(sources),
+        'width': tmx_data.width,
+        'height': tmx_data.height,
+        'tilewidth': tmx_data.tilewidth,
+        'tileheight': tmx_data.tileheight,
+        'layers': layers,
+        'masks': mask_names,
+        'files': files,
+        'images': images,
+        'strings': strings})
+
+def is_fresh(meta):
+    if meta.get('version') != MAP_CACHE_VERSION:
+        return False
+    sources = [path for path, _, _ in meta['sources']]
+    try:
+        stamps = get_stamps(sources)
+        if stamps == meta['sources']:
+            return True
+
+        # touched but not changed (checkouts, copies), only the stamps need an update
+        if get_hash(sources) == meta['hash']:
+            meta['sources'] = stamps
+            return True
+    except OSError:
+        pass
+    return False
+
+def load_compiled(tmx_path):
+    paths = get_cache_paths(tmx_path)
+    try:
+        with open(paths['meta']) as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    stamps = [list(source) for source in meta.get('sources', [])]
+    if not is_fresh(meta):
+        return None
+    if meta['sources'] != stamps:
+        try:
+            save_json(paths['meta'], meta)
+        except OSError:
+            pass
+
+    try:
+        tiles = np.load(paths['tiles'], mmap_mode = 'r')
+        objects = np.load(paths['objects'], mmap_mode = 'r')
+        masks = np.load(paths['masks'], mmap_mode = 'r')
+    except (OSError, ValueError):
+        return None
+    return CompiledMap(tmx_path, meta, tiles, objects, masks)
+
+def load_map(map_name):
+    tmx_path = MAPS[map_name][0]
+    compiled = load_compiled(tmx_path)
+    if compiled:
+        return compiled
+
+    # missing or stale, compile it now so the next start is fast
+    try:
+        compile_map(tmx_path)
+        compiled = load_compiled(tmx_path)
+    except OSError:
+        compiled = None
+    return compiled or load_pygame(tmx_path)
+
+def get_mask(tmx_data, layer_name):
+    # bool array of the cells that have a tile on a layer, works for pytmx maps as well
+    layer = tmx_data.get_layer_by_name(layer_name)
+    mask = getattr(layer, 'mask', None)
+    if mask is None:
+        mask = np.array(layer.data) != 0
+    return mask
+
+class CompiledMap:
+    def __init__(self, filename, meta, tiles, objects, masks):
+        self.filename = filename
+        self.width = meta['width']
+        self.height = meta['height']
+        self.tilewidth = meta['tilewidth']
+        self.tileheight = meta['tileheight']
+
+        # tile surfaces are created the first time a gid is used
+        self.files = meta['files']
+        self.image_table = meta['images']
+        self.loaded_images = {}
+        # the preloader bakes from this map on its own thread
+        self.lock = threading.Lock()
+
+        mask_layers = dict(zip(meta['masks'], masks))
+        self.layers = []
+        self.layernames = {}
+        for index, layer in enumerate(meta['layers']):
+            if layer['kind'] == 'tiles':
+                compiled_layer = CompiledTileLayer(self, layer['name'], tiles[layer['index']], mask_layers.get(layer['name']))
+            else:
+                compiled_layer = CompiledObjectLayer(self, layer['name'], objects[objects['layer'] == index], meta['strings'])
+            self.layers.append(compiled_layer)
+            self.layernames[layer['name']] = compiled_layer
+
+    def get_layer_by_name(self, name):
+        # same error as pytmx, level.setup relies on it
+        try:
+            return self.layernames[name]
+        except KeyError:
+            raise ValueError(f'Layer "{name}" not found.')
+
+    def get_image(self, gid):
+        with self.lock:
+            if gid not in self.loaded_images:
+                self.loaded_images[gid] = self.load_image(gid)
+            return self.loaded_images[gid]
+
+    def load_image(self, gid):
+        # mirrors the pytmx pygame loader, so tiles look and blit the same
+        file_index, colorkey, rect, flags = self.image_table[gid]
+        sheet = assets.image(self.files[file_index])
+        tile = sheet.subsurface(rect) if rect else sheet.copy()
+        if flags:
+            tile = handle_transformation(tile, TileFlags(*flags))
+        return smart_convert(tile, pygame.Color(f'#{colorkey}') if colorkey else None, True)
+
+class CompiledTileLayer:
+    def __init__(self, parent, name, data, mask):
+        self.parent = parent
+        self.name = name
+        self.data = data
+        self.width = data.shape[1]
+        self.height = data.shape[0]
+        if mask is not None:
+            self.mask = np.unpackbits(mask, axis = 1, count = self.width).astype(bool)
+
+    def tiles(self):
+        # row by row, like pytmx
+        ys, xs = np.nonzero(self.data)
+        get_image = self.parent.get_image
+        for x, y, gid in zip(xs.tolist(), ys.tolist(), self.data[ys, xs].tolist()):
+            yield x, y, get_image(gid)
+
+class CompiledObjectLayer:
+    def __init__(self, parent, name, records, strings):
+        self.parent = parent
+        self.name = name
+        self.objects = [CompiledObject(parent, record, strings) for record in records]
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __len__(self):
+        return len(self.objects)
+
+class CompiledObject:
+    def __init__(self, parent, record, strings):
+        self.parent = parent
+        self.id = int(record['id'])
+        self.name = strings[record['name']]
+        self.type = strings[record['type']]
+        self.x = float(record['x'])
+        self.y = float(record['y'])
+        self.width = float(record['width'])
+        self.height = float(record['height'])
+        self.gid = int(record['gid'])
+
+    @property
+    def image(self):
+        if self.gid:
+            return self.parent.get_image(self.gid)
+
+if __name__ == '__main__':
+    # offline compile: python code/mapcache.py, from the project folder
+    for map_name, (tmx_path, _) in MAPS.items():
+        compile_map(tmx_path)
+        print(f'compiled {map_name} -> {get_cache_paths(tmx_path)["meta"]}')
@@ -1,6 +1,8 @@
 import pygame
 from Settings import *
-from Timer import Timer
+from Timer import Timer, ui_clock
+from ui import Panel, TextCache, Widget
+from farm import sell, buy
 
 class Menu:
     def __init__(self, player, toggle_menu):
@@ -10,6 +12,7 @@ class Menu:
         self.toggle_menu = toggle_menu
         self.display_surface = pygame.display.get_surface()
         self.font = pygame.font.Font('font/LycheeSoda.ttf', 30)
+        self.text_cache = TextCache(self.font)
 
         #options
         self.width = 400
@@ -23,14 +26,7 @@ class Menu:
 
         # movement
         self.index = 0
-        self.timer = Timer(200)
-
-    def display_money(self):
-         text_surf = self.font.render(f'€{self.player.money}', False, 'Black')
-         text_rect = text_surf.get_rect(midbottom = (SCREEN_WIDTH / 2, SCREEN_HEIGHT - 20))
-
-         pygame.draw.rect(self.display_surface, 'White', text_rect.inflate(10,10),0,4)
-         self.display_surface.blit(text_surf, text_rect)
+        self.timer = Timer(200, clock = ui_clock)
 
     def setup(self):
          self.text_surf = []
@@ -49,9 +45,24 @@ class Menu:
          self.buy_text = self.font.render('buy', False, 'Black')
          self.sell_text = self.font.render('sell', False, 'Black')
 
+         # the widgets keep their graphics until the value they show changes
+         self.entries_panel = Panel(self.main_rect, UI_COLORKEY)
+         for text_index, text_surf in enumerate(self.text_surf):
+              height = text_surf.get_height() + (self.padding * 2)
+              top = text_index * (height + self.space)
+              self.entries_panel.add(ShopEntry(pygame.Rect(0, top, self.width, height), self, text_index, text_surf))
+
+         self.money_panel = Panel((SCREEN_WIDTH / 2 - self.width / 2, SCREEN_HEIGHT - 80, self.width, 80), UI_COLORKEY)
+         self.money_panel.add(MoneyLabel(pygame.Rect((0, 0), self.money_panel.rect.size), self))
+
+    def get_amount(self, index):
+         item = self.options[index]
+         if index <= self.sell_border:
+              return self.player.item_inventory[item]
+         return self.player.seed_inventory[item]
+
     def input(self):
         keys = pygame.key.get_pressed()
-        self.timer.update()
 
         if keys[pygame.K_ESCAPE]:
                 self.toggle_menu()
@@ -73,52 +84,69 @@ class Menu:
 
                  #sell
                  if self.index <= self.sell_border:
-                     if self.player.item_inventory[current_item] > 0:
-                         self.player.item_inventory[current_item] -= 1
-                         self.player.money += SALE_PRICES[current_item]
+                     sell(self.player, current_item)
 
                  #buy
                  else:
-                     seed_price = PURCHASE_PRICES[current_item]
-                     if self.player.money >= seed_price:
-                          self.player.seed_inventory[current_item] += 1
-                          self.player.money -= PURCHASE_PRICES[current_item]
+                     buy(self.player, current_item)
         # clamp the values
         if self.index < 0:
              self.index = len(self.options) -1
         if self.index > len(self.options) - 1:
              self.index = 0
 
-    def show_entry(self, text_surf, amount, top, selected):
-         
+    def update(self):
+        self.input()
+
+    def refresh(self):
+        return self.money_panel.refresh() + self.entries_panel.refresh()
+
+    def display(self, rects = None):
+        self.money_panel.display(rects)
+        self.entries_panel.display(rects)
+
+class MoneyLabel(Widget):
+    def __init__(self, rect, menu):
+         super().__init__(rect, lambda: menu.player.money)
+         self.menu = menu
+
+    def draw(self, surface):
+         text_surf = self.menu.text_cache.render(f'€{self.value}')
+         text_rect = text_surf.get_rect(midbottom = (self.rect.centerx, self.rect.bottom - 20))
+
+         pygame.draw.rect(surface, 'White', text_rect.inflate(10,10),0,4)
+         surface.blit(text_surf, text_rect)
+
+class ShopEntry(Widget):
+    def __init__(self, rect, menu, index, text_surf):
+         super().__init__(rect, lambda: (menu.get_amount(index), menu.index == index))
+         self.menu = menu
+         self.index = index
+         self.text_surf = text_surf
+
+    def draw(self, surface):
+         amount, selected = self.value
+         menu = self.menu
+
          # background
-         bg_rect = pygame.Rect(self.main_rect.left,top,self.width,text_surf.get_height() + (self.padding * 2))
-         pygame.draw.rect(self.display_surface, 'White', bg_rect, 0, 4)
+         bg_rect = self.rect
+         pygame.draw.rect(surface, 'White', bg_rect, 0, 4)
 
          # text
-         text_rect = text_surf.get_rect(midleft = (self.main_rect.left + 20, bg_rect.centery))
-         self.display_surface.blit(text_surf, text_rect)
+         text_rect = self.text_surf.get_rect(midleft = (bg_rect.left + 20, bg_rect.centery))
+         surface.blit(self.text_surf, text_rect)
 
          # amount
-         amount_surf = self.font.render(str(amount), False, 'Black')
-         amount_rect = amount_surf.get_rect(midright = (self.main_rect.right - 20, bg_rect.centery))
-         self.display_surface.blit(amount_surf, amount_rect)
+         amount_surf = menu.text_cache.render(str(amount))
+         amount_rect = amount_surf.get_rect(midright = (bg_rect.right - 20, bg_rect.centery))
+         surface.blit(amount_surf, amount_rect)
 
          # selected
          if selected:
-              pygame.draw.rect(self.display_surface, 'black', bg_rect,4,4)
-              if self.index <= self.sell_border: # sell
-                   pos_rect = self.sell_text.get_rect(midleft = (self.main_rect.left + 150, bg_rect.centery))
-                   self.display_surface.blit(self.sell_text,(pos_rect))
+              pygame.draw.rect(surface, 'black', bg_rect,4,4)
+              if self.index <= menu.sell_border: # sell
+                   pos_rect = menu.sell_text.get_rect(midleft = (bg_rect.left + 150, bg_rect.centery))
+                   surface.blit(menu.sell_text,(pos_rect))
               else: # buy
-                   pos_rect = self.buy_text.get_rect(midleft = (self.main_rect.left + 150, bg_rect.centery))
-                   self.display_surface.blit(self.buy_text,(pos_rect))
-
-    def update(self):
-        self.input()
-        self.display_money()
-        for text_index, text_surf in enumerate(self.text_surf):
-             top = self.main_rect.top + text_index * (text_surf.get_height() + (self.padding * 2) + self.space)
-             amount_list = list(self.player.item_inventory.values()) + list(self.player.seed_inventory.values())
-             amount = amount_list[text_index]
-             self.show_entry(text_surf, amount, top, self.index == text_index)
\ No newline at end of file
+                   pos_rect = menu.buy_text.get_rect(midleft = (bg_rect.left + 150, bg_rect.centery))
+                   surface.blit(menu.buy_text,(pos_rect))
\ No newline at end of file
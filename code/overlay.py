@@ -1,9 +1,10 @@
 import pygame
 from Settings import *
 import os
+from Support import import_image
+from ui import Panel, ImageWidget
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
-print(script_dir)
 
 class Overlay:
     def __init__(self,player):
@@ -14,18 +15,24 @@ class Overlay:
 
         #imports
         overlay_path = os.path.join(script_dir, "../graphics/overlay/")
-        self.tools_surf = {tool: pygame.image.load(f"{overlay_path}{tool}.png").convert_alpha() for tool in player.tools}
-        self.seeds_surf = {seed: pygame.image.load(f"{overlay_path}{seed}.png").convert_alpha() for seed in player.seeds}
-
-    def display(self):
-
-        # tool
-        tool_surf = self.tools_surf[self.player.selected_tool]
-        tool_rect = tool_surf.get_rect(midbottom = OVERLAY_POSITIONS["tool"])
-        self.display_surface.blit(tool_surf, tool_rect)
-
-
-        # Seeds
-        seed_surf = self.seeds_surf[self.player.selected_seed]
-        seed_rect = seed_surf.get_rect(midbottom=OVERLAY_POSITIONS["seed"])
-        self.display_surface.blit(seed_surf, seed_rect)
+        self.tools_surf = {tool: import_image(f"{overlay_path}{tool}.png") for tool in player.tools}
+        self.seeds_surf = {seed: import_image(f"{overlay_path}{seed}.png") for seed in player.seeds}
+
+        # one panel around both icons, redrawn only when the selection changes
+        tool_rect = self.get_area(self.tools_surf, OVERLAY_POSITIONS["tool"])
+        seed_rect = self.get_area(self.seeds_surf, OVERLAY_POSITIONS["seed"])
+        self.panel = Panel(tool_rect.union(seed_rect))
+        self.panel.add(ImageWidget(tool_rect.move(-self.panel.rect.x, -self.panel.rect.y), lambda: self.player.selected_tool, self.tools_surf, "midbottom"))
+        self.panel.add(ImageWidget(seed_rect.move(-self.panel.rect.x, -self.panel.rect.y), lambda: self.player.selected_seed, self.seeds_surf, "midbottom"))
+
+    def get_area(self, surfs, midbottom):
+        # the room the largest icon needs
+        area = pygame.Rect(0, 0, max(surf.get_width() for surf in surfs.values()), max(surf.get_height() for surf in surfs.values()))
+        area.midbottom = midbottom
+        return area
+
+    def refresh(self):
+        return self.panel.refresh()
+
+    def display(self, rects = None):
+        self.panel.display(rects)
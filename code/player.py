@@ -2,23 +2,29 @@ import pygame
 from Settings import *
 from Support import *
 from Timer import Timer
+from audio import sound_bank
+from animation import Action, Direction, TOOL_ACTIONS, get_animation_table, get_state
 
 class Player(pygame.sprite.Sprite):
     def __init__(self, pos, group, collision_sprites, tree_sprites, interaction, soil_layer, toggle_shop):
         super().__init__(group)
 
         self.import_assets()
-        self.status = "down_idle"
+        # status: which way the player faces and what it does, state indexes the animation tables
+        self.facing = Direction.DOWN
+        self.action = Action.IDLE
+        self.state = get_state(self.facing, self.action)
         self.frame_index = 0
         
         # general setup
-        self.image = self.animations[self.status][self.frame_index]
+        self.image = self.animations[self.state][self.frame_index]
         self.rect = self.image.get_rect(center = pos)
         self.z = LAYERS["main"]
 
         #movement attributes
         self.direction = pygame.math.Vector2()
         self.pos = pygame.math.Vector2(self.rect.center)
+        self.old_pos = self.pos.copy()
         self.speed = 200
         self.stamina = 100   ### Move TO A NORMAL VALUE, only for debugging!
         self.stamina_cooldown = 0
@@ -50,17 +56,9 @@ class Player(pygame.sprite.Sprite):
         self.selected_seed = self.seeds[self.seed_index]
 
         #inventory
-        self.item_inventory = {
-            'wood':   0,
-            'apple':  0,
-            'corn':   0,
-            'tomato': 0, 
-        }
-        self.seed_inventory = {
-        'corn': 5,
-        'tomato': 5
-        }
-        self.money = 200
+        self.item_inventory = dict(START_ITEMS)
+        self.seed_inventory = dict(START_SEEDS)
+        self.money = START_MONEY
 
         #intercation
         self.tree_sprites = tree_sprites
@@ -69,15 +67,14 @@ class Player(pygame.sprite.Sprite):
         self.soil_layer = soil_layer
         self.toggle_shop = toggle_shop
 
-        # sound
-        self.watering = pygame.mixer.Sound('audio/water.mp3')
-        self.watering.set_volume(0.2)
+    def get_stamina_bar_rect(self):
+        return pygame.Rect(540, 700, self.stamina_bar_width, self.stamina_bar_height)
 
     def draw_stamina_bar(self, screen):
         # Calculate width of the stamina bar based on current stamina
         current_stamina_width = int((self.stamina / 100) * self.stamina_bar_width)
         # Create the stamina bar rectangle
-        stamina_bar_rect = pygame.Rect(540, 700, self.stamina_bar_width, self.stamina_bar_height)
+        stamina_bar_rect = self.get_stamina_bar_rect()
         # Create a smaller rectangle representing current stamina
         current_stamina_rect = pygame.Rect(stamina_bar_rect.x, stamina_bar_rect.y,current_stamina_width, stamina_bar_rect.height)
         # Draw the empty stamina bar
@@ -85,8 +82,19 @@ class Player(pygame.sprite.Sprite):
         # Draw the current stamina bar
         pygame.draw.rect(screen, self.stamina_bar_color_full, current_stamina_rect)
 
+    def get_state(self):
+        return {
+            'items': dict(self.item_inventory),
+            'seeds': dict(self.seed_inventory),
+            'money': self.money}
+
+    def load_state(self, state):
+        self.item_inventory.update(state['items'])
+        self.seed_inventory.update(state['seeds'])
+        self.money = state['money']
+
     def get_target_pos(self):
-        self.target_pos = self.rect.center + PLAYER_TOOL_OFFSET[self.status.split('_')[0]]
+        self.target_pos = self.rect.center + self.tool_offsets[self.facing]
 
     def use_tool(self):
         if self.selected_tool == "hoe":
@@ -99,7 +107,7 @@ class Player(pygame.sprite.Sprite):
 
         if self.selected_tool == "water":
             self.soil_layer.water(self.target_pos)
-            self.watering.play()
+            sound_bank.play('water')
 
     def use_seed(self):
         if self.seed_inventory[self.selected_seed] > 0:
@@ -107,23 +115,18 @@ class Player(pygame.sprite.Sprite):
             self.seed_inventory[self.selected_seed] -= 1
 
     def import_assets(self):    
-        self.animations = {'up': [],'down': [],'left': [],'right': [],
-			                'right_idle':[],'left_idle':[],'up_idle':[],'down_idle':[],
-			                'right_hoe':[],'left_hoe':[],'up_hoe':[],'down_hoe':[],
-			                'right_axe':[],'left_axe':[],'up_axe':[],'down_axe':[],
-			                'right_water':[],'left_water':[],'up_water':[],'down_water':[]}
-
-        for animation in self.animations.keys():
-            full_path = './/graphics/character/' + animation
-            self.animations[animation] = import_folder(full_path)
+        # frames and tool offsets by state, every character animation comes from one sheet
+        table = get_animation_table('character', 'graphics/character')
+        self.animations = table.frames
+        self.tool_offsets = table.tool_offsets
 
 
     def animate(self,dt):
         self.frame_index += 4 * dt
-        if self.frame_index >= len(self.animations[self.status]):
+        if self.frame_index >= len(self.animations[self.state]):
             self.frame_index = 0
 
-        self.image = self.animations[self.status][int(self.frame_index)]
+        self.image = self.animations[self.state][int(self.frame_index)]
 
     def input(self, dt):
         keys = pygame.key.get_pressed()
@@ -135,32 +138,36 @@ class Player(pygame.sprite.Sprite):
             # Sprint & Stamina logic
             if keys[pygame.K_LSHIFT] and self.stamina > 0 and self.stamina_cooldown <= 0:
                 self.speed = 500
-                self.stamina -= 0.1
+                self.stamina -= 6 * dt
                 if self.stamina <= 0:
                     self.stamina = 0
                     self.stamina_cooldown = 5
             else:
                 self.speed = 200
                 if self.stamina < 100 and self.stamina_cooldown <= 0:
-                    self.stamina += 0.1
+                    self.stamina = min(self.stamina + 6 * dt, 100)
 
         # Movement directions
         if keys[pygame.K_UP] or keys[pygame.K_w]:
             self.direction.y = -1
-            self.status = "up"
+            self.facing = Direction.UP
+            self.action = Action.MOVE
             
         elif keys[pygame.K_DOWN] or keys[pygame.K_s]:
             self.direction.y = 1
-            self.status = "down"
+            self.facing = Direction.DOWN
+            self.action = Action.MOVE
         else:
             self.direction.y = 0
 
         if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
             self.direction.x = 1
-            self.status = "right"
+            self.facing = Direction.RIGHT
+            self.action = Action.MOVE
         elif keys[pygame.K_LEFT] or keys[pygame.K_a]:
             self.direction.x = -1
-            self.status = "left"
+            self.facing = Direction.LEFT
+            self.action = Action.MOVE
         else:
             self.direction.x = 0
 
@@ -197,7 +204,8 @@ class Player(pygame.sprite.Sprite):
                 if collided_interaction_sprite[0].name == 'Trader':
                     self.toggle_shop()
                 else:
-                    self.status = 'left_idle'
+                    self.facing = Direction.LEFT
+                    self.action = Action.IDLE
                     self.sleep = True        
 
 
@@ -205,36 +213,31 @@ class Player(pygame.sprite.Sprite):
     def get_status(self):
         # if the player is not moving so IDLE:
         if self.direction.magnitude() == 0:
-        #add _idle to the status
-            self.status = self.status.split("_")[0] + "_idle"
+            self.action = Action.IDLE
 
         #tool use
         if self.timers["tool use"].active:
-            self.status = self.status.split("_")[0] + "_" + self.selected_tool
-
-    def update_timers(self):
-        for timer in self.timers.values():
-            timer.update()
+            self.action = TOOL_ACTIONS[self.selected_tool]
+        self.state = get_state(self.facing, self.action)
 
     def collision(self, direction):
-        for sprite in self.collision_sprites.sprites():
-            if hasattr(sprite, "hitbox"):
-                if sprite.hitbox.colliderect(self.hitbox):
-                    if direction == "horizontal":
-                        if self.direction.x > 0: #moving right
-                            self.hitbox.right = sprite.hitbox.left
-                        if self.direction.x < 0: #moving left
-                            self.hitbox.left = sprite.hitbox.right
-                        self.rect.centerx = self.hitbox.centerx
-                        self.pos.x = self.hitbox.centerx
-
-                    if direction == "vertical":
-                        if self.direction.y > 0: #moving down
-                            self.hitbox.bottom = sprite.hitbox.top
-                        if self.direction.y < 0: #moving up
-                            self.hitbox.top = sprite.hitbox.bottom
-                        self.rect.centery = self.hitbox.centery
-                        self.pos.y = self.hitbox.centery
+        for sprite in self.collision_sprites.nearby(self.hitbox):
+            if sprite.hitbox.colliderect(self.hitbox):
+                if direction == "horizontal":
+                    if self.direction.x > 0: #moving right
+                        self.hitbox.right = sprite.hitbox.left
+                    if self.direction.x < 0: #moving left
+                        self.hitbox.left = sprite.hitbox.right
+                    self.rect.centerx = self.hitbox.centerx
+                    self.pos.x = self.hitbox.centerx
+
+                if direction == "vertical":
+                    if self.direction.y > 0: #moving down
+                        self.hitbox.bottom = sprite.hitbox.top
+                    if self.direction.y < 0: #moving up
+                        self.hitbox.top = sprite.hitbox.bottom
+                    self.rect.centery = self.hitbox.centery
+                    self.pos.y = self.hitbox.centery
         
     def move(self,dt):
 
@@ -254,9 +257,9 @@ class Player(pygame.sprite.Sprite):
         self.collision("vertical")
 
     def update(self, dt):
+        self.old_pos.update(self.pos)
         self.input(dt)
         self.get_status()
-        self.update_timers()
         self.get_target_pos()
 
         self.move(dt)
@@ -0,0 +1,94 @@
+import threading
+import traceback
+from collections import deque
+import pygame
+from Settings import *
+from assets import assets
+from chunks import bake_ground, bake_static_layer, get_static_layers
+from mapcache import load_map
+
+class Preloader:
+    def __init__(self):
+
+        # maps waiting for the worker, the next one first
+        self.jobs = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+
+        # map -> parsed tmx data, and how far along each requested map is (0 - 1)
+        self.results = {}
+        self.progress = {}
+
+    def request(self, map_name, urgent = False):
+        with self.condition:
+            if map_name in self.progress:
+                # the player is already waiting for this one, so it jumps the queue
+                if urgent and map_name in self.jobs:
+                    self.jobs.remove(map_name)
+                    self.jobs.appendleft(map_name)
+                return
+            self.progress[map_name] = 0
+            if urgent:
+                self.jobs.appendleft(map_name)
+            else:
+                self.jobs.append(map_name)
+            self.condition.notify()
+
+        if not self.thread:
+            self.thread = threading.Thread(target = self.run, name = 'preloader', daemon = True)
+            self.thread.start()
+
+    def get_progress(self, map_name):
+        return self.progress.get(map_name, 0)
+
+    def ready(self, map_name):
+        return self.progress.get(map_name) == 1
+
+    def take(self, map_name):
+        # the level itself is built on the main thread, it only gets the warm tmx data
+        with self.condition:
+            self.progress.pop(map_name, None)
+            return self.results.pop(map_name, None)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.jobs:
+                    self.condition.wait()
+                map_name = self.jobs.popleft()
+
+            try:
+                tmx_data = self.load(map_name)
+            except Exception:
+                # the game is shutting down
+                if not pygame.display.get_init():
+                    return
+                # the level loads the map itself then, and raises the error on the main thread
+                traceback.print_exc()
+                tmx_data = None
+
+            with self.condition:
+                self.results[map_name] = tmx_data
+                self.progress[map_name] = 1
+
+    def load(self, map_name):
+        ground_image_path = MAPS[map_name][1]
+        tmx_data = load_map(map_name)
+        static_layers = get_static_layers(tmx_data)
+        steps = len(static_layers) + 2
+        self.progress[map_name] = 1 / steps
+
+        # fills the same caches the level reads from
+        if ground_image_path:
+            assets.image(ground_image_path)
+        else:
+            bake_ground(map_name, tmx_data)
+        self.progress[map_name] = 2 / steps
+
+        for index, (layer_names, z) in enumerate(static_layers):
+            bake_static_layer(map_name, tmx_data, layer_names, z)
+            # 1 is only set once the result is stored
+            self.progress[map_name] = min((index + 3) / steps, 0.99)
+        return tmx_data
+
+preloader = Preloader()
@@ -0,0 +1,217 @@
+import csv
+import json
+import os
+from collections import Counter, deque
+from time import perf_counter_ns
+import pygame
+from Settings import *
+
+class Profiler:
+    def __init__(self):
+
+        # state
+        self.enabled = False
+        self.show_hud = False
+        self.recording = False
+
+        # current frame
+        self.frame_start = 0
+        self.last_mark = 0
+        self.phase_times = {}
+        self.events = []
+
+        # history
+        self.history = {}
+        self.frames = []
+        self.sprite_counts = Counter()
+
+        # startup: phases from the process start to the first frame, and the decodes on worker threads
+        self.starting = False
+        self.startup_origin = 0
+        self.startup_last = 0
+        self.startup_events = []
+        self.first_frame_ms = None
+
+        # hud
+        self.font = None
+        self.hud_surf = None
+        self.last_refresh = 0
+
+    def update_enabled(self):
+        self.enabled = self.show_hud or self.recording
+
+    def toggle_hud(self):
+        self.show_hud = not self.show_hud
+        self.update_enabled()
+
+    def toggle_recording(self):
+        if self.recording:
+            self.save(PROFILER_TRACE_PATH)
+            self.frames = []
+        self.recording = not self.recording
+        self.update_enabled()
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame_start = self.last_mark = perf_counter_ns()
+        self.phase_times = {}
+        self.events = []
+
+    def mark(self, phase):
+        # everything since the previous mark is booked on this phase
+        if not self.enabled:
+            return
+        now = perf_counter_ns()
+        self.phase_times[phase] = self.phase_times.get(phase, 0) + now - self.last_mark
+        if self.recording:
+            self.events.append((phase, self.last_mark, now - self.last_mark))
+        self.last_mark = now
+
+    def end_frame(self):
+        if not self.enabled or not self.frame_start:
+            return
+        self.phase_times['frame'] = self.last_mark - self.frame_start
+        for phase, duration in self.phase_times.items():
+            if phase not in self.history:
+                self.history[phase] = deque(maxlen = PROFILER_WINDOW)
+            self.history[phase].append(duration / 1e6)
+        if self.recording:
+            self.frames.append((self.frame_start, self.phase_times, self.events))
+
+    def begin_startup(self, start):
+        self.starting = True
+        self.startup_origin = self.startup_last = start
+
+    def startup_mark(self, phase):
+        # like mark, everything since the previous startup mark is booked on this phase
+        if not self.starting:
+            return
+        now = perf_counter_ns()
+        self.startup_events.append((phase, 'main', self.startup_last, now - self.startup_last))
+        self.startup_last = now
+
+    def startup_span(self, name, start, end, thread):
+        # list.append is atomic, worker threads add their spans directly
+        if self.starting:
+            self.startup_events.append((name, thread, start, end - start))
+
+    def end_startup(self):
+        if not self.starting:
+            return
+        self.startup_mark('first frame')
+        self.starting = False
+        self.first_frame_ms = (self.startup_last - self.startup_origin) / 1e6
+        if STARTUP_TRACE_PATH:
+            self.save_startup_trace(STARTUP_TRACE_PATH)
+
+    def get_startup_times(self):
+        # ms per main thread phase, phases that were marked more than once are summed
+        times = {}
+        for phase, thread, _, duration in self.startup_events:
+            if thread == 'main':
+                times[phase] = times.get(phase, 0) + duration / 1e6
+        return times
+
+    def percentiles(self, phase):
+        samples = sorted(self.history[phase])
+        pick = lambda fraction: samples[min(int(len(samples) * fraction), len(samples) - 1)]
+        return pick(0.5), pick(0.95), pick(0.99)
+
+    def count_sprites(self, level):
+        self.sprite_counts = Counter(type(sprite).__name__ for sprite in level.all_sprites)
+        self.sprite_counts['RainDrop'] = level.rain.drops.count
+        self.sprite_counts['RainFloor'] = level.rain.floor.count
+
+    def render_hud(self):
+        if not self.font:
+            self.font = pygame.font.Font(None, 20)
+
+        rows = [('phase ms', 'p50', 'p95', 'p99')]
+        for phase in sorted(self.history, key = lambda phase: phase != 'frame'):
+            rows.append((phase, *(f'{value:.2f}' for value in self.percentiles(phase))))
+        rows.append(())
+        if self.first_frame_ms is not None:
+            rows.append(('first frame', f'{self.first_frame_ms:.0f}'))
+        rows += [(name, str(count)) for name, count in self.sprite_counts.most_common()]
+        if self.recording:
+            rows.append((f'recording {len(self.frames)} frames',))
+
+        # first column left aligned, the numbers right aligned
+        columns = (8, 190, 240, 290)
+        self.hud_surf = pygame.Surface((columns[-1] + 8, len(rows) * 16 + 12), pygame.SRCALPHA)
+        self.hud_surf.fill((0, 0, 0, 170))
+        for index, row in enumerate(rows):
+            y = 6 + index * 16
+            for column, text in enumerate(row):
+                text_surf = self.font.render(text, False, 'White')
+                if column == 0:
+                    self.hud_surf.blit(text_surf, (columns[0], y))
+                else:
+                    self.hud_surf.blit(text_surf, text_surf.get_rect(topright = (columns[column], y)))
+
+    def display(self, surface, level):
+        if not self.show_hud or not self.history:
+            return
+
+        # percentiles and counts only refresh a few times per second
+        now = pygame.time.get_ticks()
+        if not self.hud_surf or now - self.last_refresh >= PROFILER_HUD_REFRESH:
+            self.last_refresh = now
+            self.count_sprites(level)
+            self.render_hud()
+        surface.blit(self.hud_surf, (10, 10))
+
+    def save(self, path):
+        if not self.frames:
+            return
+        if path.endswith('.csv'):
+            self.save_csv(path)
+        else:
+            self.save_chrome_trace(path)
+
+    def save_csv(self, path):
+        phases = sorted({phase for _, phase_times, _ in self.frames for phase in phase_times})
+        with open(path, 'w', newline = '') as file:
+            writer = csv.writer(file)
+            writer.writerow(['frame', 'start_ms'] + [f'{phase}_ms' for phase in phases])
+            origin = self.frames[0][0]
+            for index, (start, phase_times, _) in enumerate(self.frames):
+                writer.writerow([index, round((start - origin) / 1e6, 3)] + [round(phase_times.get(phase, 0) / 1e6, 3) for phase in phases])
+
+    def save_chrome_trace(self, path):
+        # load in chrome://tracing or ui.perfetto.dev
+        origin = self.frames[0][0]
+        trace_events = []
+        for index, (start, phase_times, events) in enumerate(self.frames):
+            trace_events.append({
+                'name': 'frame', 'ph': 'X', 'pid': 0, 'tid': 0,
+                'ts': (start - origin) / 1e3, 'dur': phase_times['frame'] / 1e3,
+                'args': {'frame': index}})
+            for phase, phase_start, duration in events:
+                trace_events.append({
+                    'name': phase, 'ph': 'X', 'pid': 0, 'tid': 0,
+                    'ts': (phase_start - origin) / 1e3, 'dur': duration / 1e3})
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, file)
+
+    def save_startup_trace(self, path):
+        # one track for the main thread and one per decode thread
+        threads = ['main'] + sorted({thread for _, thread, _, _ in self.startup_events} - {'main'})
+        trace_events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': index, 'args': {'name': thread}}
+            for index, thread in enumerate(threads)]
+        for name, thread, start, duration in self.startup_events:
+            trace_events.append({
+                'name': name, 'ph': 'X', 'pid': 0, 'tid': threads.index(thread),
+                'ts': (start - self.startup_origin) / 1e3, 'dur': duration / 1e3})
+        trace_events.append({
+            'name': 'startup', 'ph': 'X', 'pid': 0, 'tid': 0, 'ts': 0,
+            'dur': self.first_frame_ms * 1e3, 'args': {k: round(v, 2) for k, v in self.get_startup_times().items()}})
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok = True)
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, file)
+
+profiler = Profiler()
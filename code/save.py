@@ -0,0 +1,215 @@
+import io
+import os
+import pickle
+import queue
+import struct
+import threading
+import traceback
+import zlib
+import numpy as np
+from Settings import *
+
+# file: magic, then records of (kind, payload length, crc32) + a zlib compressed pickle of builtins
+SAVE_MAGIC = b'SPZV\x01'
+RECORD_HEADER = struct.Struct('<4sII')
+FULL, DELTA = b'FULL', b'DELT'
+# what a save that passed its checksums can still raise while it is read or applied
+SAVE_ERRORS = (pickle.UnpicklingError, zlib.error, KeyError, ValueError)
+
+class SaveUnpickler(pickle.Unpickler):
+    # a save file only ever holds builtins, anything else is refused
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f'{module}.{name} is not allowed in a save file')
+
+def pack_level(state):
+    grid = state['soil']['grid']
+    return {
+        'shape': grid.shape,
+        'grid': grid.tobytes(),
+        'plants': state['soil']['plants'],
+        'trees': state['trees'],
+        'raining': state['raining'],
+        'day': state['day']}
+
+def unpack_level(packed):
+    return {
+        'soil': {
+            'grid': np.frombuffer(packed['grid'], np.uint8).reshape(packed['shape']).copy(),
+            'plants': packed['plants']},
+        'trees': packed['trees'],
+        'raining': packed['raining'],
+        'day': packed['day']}
+
+def pack_snapshot(snapshot):
+    packed = dict(snapshot)
+    packed['levels'] = {map_name: pack_level(state) for map_name, state in snapshot['levels'].items()}
+    return packed
+
+def unpack_snapshot(packed):
+    snapshot = dict(packed)
+    snapshot['levels'] = {map_name: unpack_level(level) for map_name, level in packed['levels'].items()}
+    return snapshot
+
+def diff_level(old, new):
+    delta = {key: value for key, value in new.items() if key != 'grid' and old.get(key) != value}
+    if old['grid'] != new['grid']:
+        if old['shape'] == new['shape']:
+            # only the cells that changed
+            old_grid = np.frombuffer(old['grid'], np.uint8)
+            new_grid = np.frombuffer(new['grid'], np.uint8)
+            cells = np.flatnonzero(old_grid != new_grid).astype(np.uint32)
+            delta['cells'] = (cells.tobytes(), new_grid[cells].tobytes())
+        else:
+            delta['grid'] = new['grid']
+    return delta
+
+def diff_snapshot(old, new):
+    delta = {key: value for key, value in new.items() if key != 'levels' and old.get(key) != value}
+    delta['levels'] = {}
+    for map_name, level in new['levels'].items():
+        if map_name not in old['levels']:
+            delta['levels'][map_name] = level
+        else:
+            level_delta = diff_level(old['levels'][map_name], level)
+            if level_delta:
+                delta['levels'][map_name] = level_delta
+    return delta
+
+def apply_delta(packed, delta):
+    packed = dict(packed, **{key: value for key, value in delta.items() if key != 'levels'})
+    packed['levels'] = dict(packed['levels'])
+    for map_name, level_delta in delta['levels'].items():
+        level = dict(packed['levels'].get(map_name, {}), **level_delta)
+        if 'cells' in level:
+            cells, values = level.pop('cells')
+            grid = np.frombuffer(level['grid'], np.uint8).copy()
+            grid[np.frombuffer(cells, np.uint32)] = np.frombuffer(values, np.uint8)
+            level['grid'] = grid.tobytes()
+        packed['levels'][map_name] = level
+    return packed
+
+def encode_record(kind, data):
+    payload = zlib.compress(pickle.dumps(data, protocol = pickle.HIGHEST_PROTOCOL))
+    return RECORD_HEADER.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+def read_records(data):
+    # stops at the first torn or corrupt record, a crash during an append only loses that record
+    position = len(SAVE_MAGIC)
+    while position + RECORD_HEADER.size <= len(data):
+        kind, length, crc = RECORD_HEADER.unpack_from(data, position)
+        start = position + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if kind not in (FULL, DELTA) or len(payload) != length or zlib.crc32(payload) != crc:
+            return
+        position = start + length
+        yield kind, SaveUnpickler(io.BytesIO(zlib.decompress(payload))).load(), position
+
+class Saver:
+    def __init__(self, path):
+
+        # snapshots waiting for the writer thread
+        self.path = path
+        self.queue = queue.Queue()
+        self.thread = None
+
+        # last snapshot on disk and how many deltas follow the full one
+        self.last = None
+        self.deltas = 0
+        self.size = 0
+
+    def load(self):
+        # returns the saved snapshot, or None when there is no readable save
+        try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+        if not data.startswith(SAVE_MAGIC):
+            return None
+
+        packed = None
+        try:
+            for kind, record, end in read_records(data):
+                if kind == FULL:
+                    packed, self.deltas = record, 0
+                elif packed is not None:
+                    packed = apply_delta(packed, record)
+                    self.deltas += 1
+                self.size = end
+            if packed is None:
+                return None
+            snapshot = unpack_snapshot(packed)
+        except SAVE_ERRORS:
+            # an unreadable save is started over, the next autosave replaces it
+            traceback.print_exc()
+            self.discard()
+            return None
+        self.last = packed
+        return snapshot
+
+    def discard(self):
+        # the next snapshot is written as a new file instead of a delta
+        self.last = None
+        self.deltas = 0
+
+    def save(self, snapshot):
+        # the snapshot must not be changed afterwards, everything else runs on the writer thread
+        self.queue.put(snapshot)
+        if not self.thread:
+            self.thread = threading.Thread(target = self.run, name = 'saver', daemon = True)
+            self.thread.start()
+
+    def flush(self):
+        if self.thread:
+            self.queue.join()
+
+    def run(self):
+        while True:
+            snapshot = self.queue.get()
+            try:
+                self.write(pack_snapshot(snapshot))
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self.queue.task_done()
+
+    def write(self, packed):
+        if self.last is None or self.deltas >= SAVE_COMPACT_EVERY:
+            self.write_full(packed)
+        else:
+            delta = diff_snapshot(self.last, packed)
+            if len(delta) == 1 and not delta['levels']:
+                return
+            try:
+                self.append(encode_record(DELTA, delta))
+                self.deltas += 1
+            except OSError:
+                # the file is gone, start over with a full snapshot
+                self.write_full(packed)
+        self.last = packed
+
+    def write_full(self, packed):
+        # compaction: a new file with a single full snapshot replaces the old one in one step
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok = True)
+        data = SAVE_MAGIC + encode_record(FULL, packed)
+        with open(self.path + '.tmp', 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(self.path + '.tmp', self.path)
+        self.deltas = 0
+        self.size = len(data)
+
+    def append(self, record):
+        with open(self.path, 'r+b') as file:
+            # anything behind the last good record is dropped
+            file.seek(self.size)
+            file.write(record)
+            file.truncate()
+            file.flush()
+            os.fsync(file.fileno())
+        self.size += len(record)
+
+saver = Saver(SAVE_PATH)
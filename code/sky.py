@@ -1,73 +1,131 @@
 import pygame
 from Settings import *
 from Support import import_folder
-from sprites import Generic 
-from random import randint, choice 
+from lighting import Lighting, get_sky_colors
+import math
+import numpy as np
 
 class Sky:
-    def __init__(self):
-        self.display_surface = pygame.display.get_surface()
-        self.full_surf = pygame.Surface((SCREEN_WIDTH,SCREEN_HEIGHT))
-        self.start_color = [255,255,255]
+    def __init__(self, lights = ()):
         self.end_color = (38,101,189)
+        self.speed = 2
 
-    def display(self, dt):
-        for index, value in enumerate(self.end_color):
-            if self.start_color[index] > value:
-                self.start_color[index] -= 2 * dt
-
-        self.full_surf.fill(self.start_color)
-        self.display_surface.blit(self.full_surf, (0,0), special_flags = pygame.BLEND_RGB_MULT)
-
-class Drop(Generic):
-    def __init__(self, surf, pos, moving, groups, z):
-        
-        # general setup
-        super().__init__(pos, surf, groups, z)
-        self.lifetime = randint(400,500)
-        self.start_time = pygame.time.get_ticks()
-
-        #moving
-        self.moving = moving
-        if self.moving:
-            self.pos = pygame.math.Vector2(self.rect.topleft)
-            self.direction = pygame.math.Vector2(-2,4)
-            self.speed = randint(200,250)
+        # the colour of every day phase is known up front, the time of day just picks one
+        self.colors = get_sky_colors(self.end_color)
+        self.time = 0
+        self.lighting = Lighting(lights)
+
+    def get_color(self):
+        # rounded up, like the float colour used to be truncated
+        return self.colors[min(math.ceil(self.time * self.speed), len(self.colors) - 1)]
+
+    def reset(self):
+        self.time = 0
 
     def update(self, dt):
-        if self.moving:
-            self.pos += self.direction * self.speed * dt
-            self.rect.topleft = (round(self.pos.x), round(self.pos.y))
+        self.time += dt
+
+    def changed(self, offset):
+        return self.lighting.update(self.get_color(), offset)
+
+    def display(self, offset, rects = None):
+        self.lighting.display(self.get_color(), offset, rects)
+
+class RainParticles:
+    def __init__(self, frames, area, rate, lifetime, direction = None, speed = None):
+        self.frames = frames
+        self.frame_w = max(frame.get_width() for frame in frames)
+        self.frame_h = max(frame.get_height() for frame in frames)
+        self.area = area
+        self.rate = rate
+        self.lifetime = lifetime
+        self.direction = direction
+        self.speed = speed
+        self.rng = np.random.default_rng()
+
+        # pool, the first count entries are alive
+        capacity = int(rate * lifetime[1]) + 1
+        self.pos = np.zeros((capacity, 2), np.float32)
+        self.vel = np.zeros((capacity, 2), np.float32)
+        self.life = np.zeros(capacity, np.float32)
+        self.frame = np.zeros(capacity, np.intp)
+        self.count = 0
+        self.spawn_timer = 0
+        self.step = 0
+
+    def spawn(self, dt):
+        self.spawn_timer += self.rate * dt
+        amount = min(int(self.spawn_timer), len(self.life) - self.count)
+        self.spawn_timer -= int(self.spawn_timer)
+        if amount <= 0:
+            return
 
-        #timer
-        if pygame.time.get_ticks() - self.start_time >= self.lifetime:
-            self.kill()
+        new = slice(self.count, self.count + amount)
+        self.pos[new, 0] = self.rng.integers(0, self.area[0], amount, endpoint = True)
+        self.pos[new, 1] = self.rng.integers(0, self.area[1], amount, endpoint = True)
+        self.life[new] = self.rng.uniform(*self.lifetime, amount)
+        self.frame[new] = self.rng.integers(0, len(self.frames), amount)
+        if self.direction:
+            self.vel[new] = np.outer(self.rng.integers(*self.speed, amount, endpoint = True), self.direction)
+        self.count += amount
+
+    def update(self, dt):
+        self.step = dt
+        alive = slice(0, self.count)
+        self.life[alive] -= dt
+        if self.direction:
+            self.pos[alive] += self.vel[alive] * dt
+
+        # swap the survivors to the front of the pool
+        living = self.life[alive] > 0
+        if not living.all():
+            keep = np.flatnonzero(living)
+            self.count = len(keep)
+            self.pos[:self.count] = self.pos[keep]
+            self.vel[:self.count] = self.vel[keep]
+            self.life[:self.count] = self.life[keep]
+            self.frame[:self.count] = self.frame[keep]
+
+    def draw(self, surface, camera_rect, alpha = 1):
+        pos = self.pos[:self.count]
+        if self.direction:
+            pos = pos - self.vel[:self.count] * (self.step * (1 - alpha))
+        pos = np.rint(pos).astype(np.intp) - camera_rect.topleft
+        x, y = pos[:, 0], pos[:, 1]
+        visible = np.flatnonzero(
+            (x > -self.frame_w) & (x < camera_rect.width) &
+            (y > -self.frame_h) & (y < camera_rect.height))
+        if len(visible):
+            frames = map(self.frames.__getitem__, self.frame[visible].tolist())
+            surface.blits(list(zip(frames, pos[visible].tolist())), False)
 
 class Rain:
-    def __init__(self, all_sprites, ground_image_path):
+    def __init__(self, all_sprites, ground_size):
         self.all_sprites = all_sprites
         self.rain_drops = import_folder("graphics/rain/drops/")
         self.rain_floor = import_folder("graphics/rain/floor/")
-        self.floor_w, self.floor_h = pygame.image.load(ground_image_path).get_size()
-
-    def create_floor(self):
-        Drop(
-            surf = choice(self.rain_floor), 
-            pos = (randint(0,self.floor_w), randint(0,self.floor_h)), 
-            moving = False, 
-            groups = self.all_sprites, 
-            z = LAYERS ['rain floor']
-        )
-
-    def create_drops(self):
-        Drop(
-            surf = choice(self.rain_drops), 
-            pos = (randint(0,self.floor_w), randint(0,self.floor_h)), 
-            moving = True, 
-            groups = self.all_sprites, 
-            z = LAYERS ['rain drops']
-        )
-
-    def update(self):
-        self.create_floor()
-        self.create_drops()
\ No newline at end of file
+        self.floor_w, self.floor_h = ground_size
+
+        # particles
+        self.floor = RainParticles(
+            frames = self.rain_floor,
+            area = (self.floor_w, self.floor_h),
+            rate = RAIN_FLOOR_PER_SECOND,
+            lifetime = (0.4, 0.5))
+        self.drops = RainParticles(
+            frames = self.rain_drops,
+            area = (self.floor_w, self.floor_h),
+            rate = RAIN_DROPS_PER_SECOND,
+            lifetime = (0.4, 0.5),
+            direction = (-2, 4),
+            speed = (200, 250))
+        self.all_sprites.add_effect(LAYERS['rain floor'], self.floor)
+        self.all_sprites.add_effect(LAYERS['rain drops'], self.drops)
+
+    def update(self, dt, raining = True):
+        # drops that are already falling finish their lifetime after the rain stops
+        if raining:
+            self.floor.spawn(dt)
+            self.drops.spawn(dt)
+        self.floor.update(dt)
+        self.drops.update(dt)
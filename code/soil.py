@@ -1,9 +1,47 @@
 import pygame
 import random
+import numpy as np
 from Settings import *
-from pytmx.util_pygame import load_pygame
 from Support import *
+from audio import sound_bank
+from mapcache import get_mask
+from farm import Field, FARMABLE, TILLED, WATERED
 
+# neighbour mask bits
+TOP, RIGHT, BOTTOM, LEFT = 1, 2, 4, 8
+
+def get_tile_type(t, r, b, l):
+    tile_type = 'o'
+
+    # all sides
+    if all((t,r,b,l)): tile_type = 'x'
+
+    # horizontal tiles only
+    if l and not any((t,r,b)): tile_type = 'r'
+    if r and not any((t,l,b)): tile_type = 'l'
+    if r and l and not any((t,b)): tile_type = 'lr'
+
+    # vertical only
+    if t and not any((r,l,b)): tile_type = 'b'
+    if b and not any((r,l,t)): tile_type = 't'
+    if b and t and not any((r,l,)): tile_type = 'tb'
+
+    #corners
+    if l and b and not any((t,r)): tile_type = 'tr'
+    if r and b and not any((t,l)): tile_type = 'tl'
+    if l and t and not any((b,r)): tile_type = 'br'
+    if r and t and not any((b,l)): tile_type = 'bl'
+
+    # t shapes
+    if all((t,b,r)) and not l: tile_type = 'tbr'
+    if all((t,b,l)) and not r: tile_type = 'tbl'
+    if all((l,r,t)) and not b: tile_type = 'lrb'
+    if all((l,r,b)) and not t: tile_type = 'lrt'
+
+    return tile_type
+
+# neighbour mask -> soil graphic
+SOIL_TILES = [get_tile_type(mask & TOP, mask & RIGHT, mask & BOTTOM, mask & LEFT) for mask in range(16)]
 
 class SoilTile(pygame.sprite.Sprite):
     def __init__(self, pos, surf, groups):
@@ -20,47 +58,35 @@ class WaterTile(pygame.sprite.Sprite):
         self.z = LAYERS['soil water']
 
 class Plant(pygame.sprite.Sprite):
-    def __init__(self, plant_type, groups, soil, check_watered):
+    def __init__(self, crop, groups, soil):
         super().__init__(groups)
 
-        # setup
-        self.plant_type = plant_type
-        self.frames = import_folder(f'graphics/fruit/{plant_type}')
+        # setup, the crop grows in the field and the sprite only shows it
+        self.crop = crop
+        self.plant_type = crop.plant_type
+        self.frames = import_folder(f'graphics/fruit/{crop.plant_type}')
         self.soil = soil
-        self.check_watered = check_watered
-
-        # plant growing
-        self.age = 0
-        self.max_age = len(self.frames) - 1
-        self.grow_speed = GROW_SPEED[plant_type]
-        self.harvestable = False
 
         #sprite setup
-        self.image = self.frames[self.age]
-        self.y_offset = - 16 if plant_type == 'corn' else -8
+        self.image = self.frames[0]
+        self.y_offset = - 16 if crop.plant_type == 'corn' else -8
         self.rect = self.image.get_rect(midbottom = soil.rect.midbottom + pygame.math.Vector2(0,self.y_offset))
         self.z = LAYERS['ground plant']
+        self.refresh()
 
+    def refresh(self):
+        age = int(self.crop.age)
+        if age > 0:
+            self.z = LAYERS['main']
+            self.hitbox = self.rect.copy().inflate(-26, -self.rect.height * 0.4)
 
-    def grow(self):
-        if self.check_watered(self.rect.center):
-            self.age += self.grow_speed
-
-            if int(self.age) > 0:
-                self.z = LAYERS['main']
-                self.hitbox = self.rect.copy().inflate(-26, -self.rect.height * 0.4)
-
-            if self.age >= self.max_age:
-                self.age = self.max_age
-                self.harvestable = True
-
-            self.image = self.frames[int(self.age)]
-            self.rect = self.image.get_rect(midbottom = self.soil.rect.midbottom + pygame.math.Vector2(0,self.y_offset))
+        self.image = self.frames[age]
+        self.rect = self.image.get_rect(midbottom = self.soil.rect.midbottom + pygame.math.Vector2(0,self.y_offset))
 
 
 
 class SoilLayer:
-    def __init__(self, all_sprites, collision_sprites, tmx_data, ground_image_path):
+    def __init__(self, all_sprites, collision_sprites, tmx_data, ground_size):
 
         # sprite groups
         self.all_sprites = all_sprites
@@ -69,152 +95,134 @@ class SoilLayer:
         self.water_sprites = pygame.sprite.Group()
         self.plant_sprites = pygame.sprite.Group()
 
+        # sprites by grid cell
+        self.soil_tiles = {}
+        self.water_tiles = {}
+        self.plants = {}
+
         #graphics
         self.soil_surfs = import_folder_dict("graphics/soil/")
         self.water_surfs = import_folder("graphics/soil_water/")
 
-        self.create_soil_grid(tmx_data, ground_image_path)
-        self.create_hit_rects()
-
-        #sounds
-        self.hoe_sound = pygame.mixer.Sound('audio/hoe.wav')
-        self.hoe_sound.set_volume(0.1)
-
-        self.plant_sound = pygame.mixer.Sound('audio/plant.wav')
-        self.plant_sound.set_volume(0.2)
+        self.create_soil_grid(tmx_data, ground_size)
 
-    def create_soil_grid(self, tmx_data, ground_image_path):
-        ground = pygame.image.load(ground_image_path)
-        h_tiles, v_tiles = ground.get_width() // TITLE_SIZE, ground.get_height() // TITLE_SIZE
+    def create_soil_grid(self, tmx_data, ground_size):
+        h_tiles, v_tiles = ground_size[0] // TITLE_SIZE, ground_size[1] // TITLE_SIZE
 
-        self.grid = [[[] for col in range(h_tiles)] for row in range(v_tiles)]
-        for x,y, _ in tmx_data.get_layer_by_name('Farmable').tiles():
-            self.grid[y][x].append('F')
+        farmable = np.zeros((v_tiles, h_tiles), bool)
+        mask = get_mask(tmx_data, 'Farmable')[:v_tiles, :h_tiles]
+        farmable[:mask.shape[0], :mask.shape[1]] = mask
+        self.field = Field(farmable)
 
-    def create_hit_rects(self):
-        self.hit_rects = []
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                if 'F' in cell:
-                    x = index_col * TITLE_SIZE
-                    y = index_row * TITLE_SIZE
-                    rect = pygame.Rect(x,y,TITLE_SIZE, TITLE_SIZE)
-                    self.hit_rects.append(rect)
+    def get_cell(self, pos):
+        # grid cell under a world position, None outside of the map
+        x = int(pos[0] // TITLE_SIZE)
+        y = int(pos[1] // TITLE_SIZE)
+        rows, cols = self.field.grid.shape
+        if 0 <= x < cols and 0 <= y < rows:
+            return x, y
 
     def get_hit(self, point):
-        for rect in self.hit_rects:
-            if rect.collidepoint(point):
-                self.hoe_sound.play()
-                x = rect.x // TITLE_SIZE
-                y = rect.y // TITLE_SIZE
-
-                if 'F' in self.grid[y][x]:
-                    self.grid[y][x].append('X')
-                    self.create_soil_tiles()
-                    if self.raining:
-                        self.water_all()
+        cell = self.get_cell(point)
+        if cell and self.field.has(*cell, FARMABLE):
+            sound_bank.play('hoe')
+
+            if self.field.till(*cell):
+                self.update_soil_tiles(*cell)
+                if self.field.has(*cell, WATERED):
+                    self.create_water_tile(*cell)
 
     def water(self, target_pos):
-        for soil_sprite in self.soil_sprites.sprites():
-            if soil_sprite.rect.collidepoint(target_pos):
-                
-                # add entry to the soil grid -> 'W'
-                x = soil_sprite.rect.x // TITLE_SIZE
-                y = soil_sprite.rect.y // TITLE_SIZE
-                self.grid[y][x].append('W')
-
-                # create water sprite
-                if not self.water_surfs:
-                    self.water_surfs = import_folder_dict("graphics/soil_water/")
-                water_surf = random.choice(list(self.water_surfs))
-                water_tile = WaterTile(soil_sprite.rect.topleft, water_surf, 
-                                       [self.all_sprites, self.water_sprites])
-                
-    def water_all(self):
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                if 'X' in cell and 'W' not in cell:
-                    cell.append('W')
-                    x = index_col * TITLE_SIZE
-                    y = index_row * TITLE_SIZE
-                    WaterTile((x,y), random.choice(self.water_surfs), [self.all_sprites, self.water_sprites])
-
-                
-    def remove_water(self):
-
-        # destroy all water sprites
-        for sprite in self.water_sprites.sprites():
-            sprite.kill()
+        cell = self.get_cell(target_pos)
+        if cell and self.field.water(*cell):
+            self.create_water_tile(*cell)
 
-        # clean up the grid
-        for row in self.grid:
-            for cell in row:
-                if 'W' in cell:
-                    cell.remove('W')
+    def create_water_tile(self, x, y):
+        self.water_tiles[(x, y)] = WaterTile(
+            (x * TITLE_SIZE, y * TITLE_SIZE), random.choice(self.water_surfs), [self.all_sprites, self.water_sprites])
 
-    def check_watered(self, pos):
-        x = pos[0] // TITLE_SIZE
-        y = pos[1] // TITLE_SIZE
-        cell = self.grid[y][x]
-        is_watered = 'W' in cell
-        return is_watered
+    def create_water_tiles(self):
+        # full rebuild from the grid
+        for sprite in self.water_sprites.sprites():
+            sprite.kill()
+        self.water_tiles.clear()
+        for index_row, index_col in np.argwhere(self.field.grid & WATERED).tolist():
+            self.create_water_tile(index_col, index_row)
 
     def plant_seed(self, target_pos, seed):
-        for soil_sprite in self.soil_sprites.sprites():
-            if soil_sprite.rect.collidepoint(target_pos):
-                self.plant_sound.play()
-
-                x = soil_sprite.rect.x // TITLE_SIZE
-                y = soil_sprite.rect.y // TITLE_SIZE
-                if 'P' not in self.grid[y][x]:
-                    self.grid[y][x].append('P')
-                    Plant(seed, [self.all_sprites, self.plant_sprites, self.collision_sprites], soil_sprite, self.check_watered)
-
-    def update_plants(self):
+        cell = self.get_cell(target_pos)
+        if cell in self.soil_tiles:
+            sound_bank.play('plant')
+
+            crop = self.field.plant(*cell, seed)
+            if crop:
+                self.create_plant(cell, crop)
+
+    def create_plant(self, cell, crop):
+        self.plants[cell] = Plant(crop, [self.all_sprites, self.plant_sprites, self.collision_sprites], self.soil_tiles[cell])
+
+    def harvest(self, plant):
+        # plant type of a ripe plant, which is removed
+        cell = self.get_cell(plant.soil.rect.topleft)
+        del self.plants[cell]
+        plant.kill()
+        return self.field.harvest(*cell)
+
+    def get_plants(self, rect):
+        # plants reach at most one cell above their soil tile
+        left, top = rect.left // TITLE_SIZE, rect.top // TITLE_SIZE
+        right, bottom = rect.right // TITLE_SIZE, rect.bottom // TITLE_SIZE + 1
+        return [self.plants[(x, y)] for x in range(left, right + 1) for y in range(top, bottom + 1) if (x, y) in self.plants]
+
+    def refresh(self):
+        # the field changed underneath, nights passed: water and plants follow it again
+        self.create_water_tiles()
         for plant in self.plant_sprites.sprites():
-            plant.grow()
-
+            plant.refresh()
+            self.all_sprites.refresh(plant)
+            self.collision_sprites.refresh(plant)
+
+    def is_tilled(self, x, y):
+        return self.field.has(x, y, TILLED)
+
+    def get_neighbour_mask(self, x, y):
+        mask = 0
+        if self.is_tilled(x, y - 1): mask |= TOP
+        if self.is_tilled(x + 1, y): mask |= RIGHT
+        if self.is_tilled(x, y + 1): mask |= BOTTOM
+        if self.is_tilled(x - 1, y): mask |= LEFT
+        return mask
+
+    def update_soil_tile(self, x, y):
+        if not self.is_tilled(x, y):
+            return
+
+        surf = self.soil_surfs[SOIL_TILES[self.get_neighbour_mask(x, y)]]
+        if (x, y) in self.soil_tiles:
+            self.soil_tiles[(x, y)].image = surf
+        else:
+            self.soil_tiles[(x, y)] = SoilTile(
+                pos = (x * TITLE_SIZE, y * TITLE_SIZE),
+                surf = surf,
+                groups = [self.all_sprites, self.soil_sprites])
+
+    def update_soil_tiles(self, x, y):
+        # a new tile only changes its own graphic and the ones of its four neighbours
+        for col, row in ((x, y), (x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+            self.update_soil_tile(col, row)
 
     def create_soil_tiles(self):
-        self.soil_sprites.empty()
-        for index_row, row in enumerate(self.grid):
-            for index_col, cell in enumerate(row):
-                if 'X' in cell:
-
-                    # tile options
-                    t = 'X' in self.grid[index_row - 1][index_col]
-                    b = 'X' in self.grid[index_row + 1][index_col]
-                    r = 'X' in row[index_col + 1]
-                    l = 'X' in row[index_col - 1]
-
-                    tile_type = 'o'
-
-                    # all sides
-                    if all((t,r,b,l)): tile_type = 'x'
-
-                    # horizontal tiles only
-                    if l and not any((t,r,b)): tile_type = 'r'
-                    if r and not any((t,l,b)): tile_type = 'l'
-                    if r and l and not any((t,b)): tile_type = 'lr'
-
-                    # vertical only
-                    if t and not any((r,l,b)): tile_type = 'b'
-                    if b and not any((r,l,t)): tile_type = 't'
-                    if b and t and not any((r,l,)): tile_type = 'tb'
-
-                    #corners
-                    if l and b and not any((t,r)): tile_type = 'tr'
-                    if r and b and not any((t,l)): tile_type = 'tl'
-                    if l and t and not any((b,r)): tile_type = 'br'
-                    if r and t and not any((b,l)): tile_type = 'bl'
-
-                    # t shapes
-                    if all((t,b,r)) and not l: tile_type = 'tbr'
-                    if all((t,b,l)) and not r: tile_type = 'tbl'
-                    if all((l,r,t)) and not b: tile_type = 'lrb'
-                    if all((l,r,b)) and not t: tile_type = 'lrt'
-
-                    SoilTile(
-                        pos = (index_col * TITLE_SIZE, index_row * TITLE_SIZE), 
-                        surf = self.soil_surfs[tile_type], 
-                        groups = [self.all_sprites, self.soil_sprites])
\ No newline at end of file
+        # full rebuild from the grid, existing tiles are reused
+        for index_row, index_col in np.argwhere(self.field.grid & TILLED).tolist():
+            self.update_soil_tile(index_col, index_row)
+
+    def get_state(self):
+        return self.field.get_state()
+
+    def load_state(self, state):
+        # only called on a freshly built layer
+        self.field.load_state(state)
+        self.create_soil_tiles()
+        self.create_water_tiles()
+        for cell, crop in self.field.crops.items():
+            self.create_plant(cell, crop)
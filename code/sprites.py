@@ -1,7 +1,10 @@
 import pygame
 from Settings import *
-from random import randint, choice
-from Timer import Timer
+from Timer import Timer, sim_clock
+from audio import sound_bank
+from Support import import_image
+from effects import get_silhouette
+from farm import FruitTree
 
 class Generic(pygame.sprite.Sprite):
     def __init__(self, pos, surf, groups, z =LAYERS["main"]):
@@ -47,82 +50,86 @@ class WildFlower(Generic):
 
 class Particle(Generic):
     def __init__(self, pos, surf, groups, z, duration = 200):
-        super().__init__(pos, surf, groups, z)
-        self.start_time = pygame.time.get_ticks()
-        self.duration = duration
-
         #white surface
-        mask_surf = pygame.mask.from_surface(self.image)
-        new_surf = mask_surf.to_surface()
-        new_surf.set_colorkey((0,0,0))
-        self.image = new_surf
+        super().__init__(pos, get_silhouette(surf), groups, z)
 
-    def update(self,dt):
-        current_time = pygame.time.get_ticks()
-        if current_time - self.start_time > self.duration:
-            self.kill()
+        # duration in ms of game time, it doesn't run out while the game is paused
+        sim_clock.schedule(duration / 1000, self.kill)
 
 class Tree(Generic):
     def __init__(self, pos, surf, groups, name, player_add):
         super().__init__(pos, surf, groups)
+        self.all_sprites = groups[0]
+        self.collision_sprites = groups[1]
 
-        #tree attributes
-        self.health = 5
-        self.alive = True
+        #tree attributes, health and apples live in the fruit tree
+        self.fruit_tree = FruitTree(name)
         stump_path = f"graphics/stumps/{'small' if name == 'small' else 'large'}.png"
-        self.stump_surf = pygame.image.load(stump_path).convert_alpha()
+        self.stump_surf = import_image(stump_path)
 
-        #apples
-        self.apple_surf = pygame.image.load("graphics/fruit/apple.png")
-        self.apple_pos = APPLE_POS[name]
+        #apples, by the spot they grow on
+        self.apple_surf = import_image("graphics/fruit/apple.png")
+        self.apple_pos = [(x + self.rect.left, y + self.rect.top) for x, y in APPLE_POS[name]]
         self.apple_sprites = pygame.sprite.Group()
-        self.create_fruit()
+        self.apples = {}
+        self.create_apples()
 
         self.player_add = player_add
 
-        # sounds
-        self.axe_sound = pygame.mixer.Sound('audio/axe.mp3')
-
     def damage(self):
 
         #damaging the tree
-        self.health -= 1
+        spot = self.fruit_tree.damage()
 
         # play sound
-        self.axe_sound.play()
+        sound_bank.play('axe')
 
         #remove apple
-        if len(self.apple_sprites.sprites()) > 0:
-            random_apple = choice(self.apple_sprites.sprites())
+        if spot is not None:
+            apple = self.apples.pop(spot)
             Particle(
-                pos = random_apple.rect.topleft,
-                surf =  random_apple.image,
-                groups = self.groups()[0],
+                pos = apple.rect.topleft,
+                surf =  apple.image,
+                groups = self.all_sprites,
                 z = LAYERS['fruit'])
             self.player_add('apple')
-            random_apple.kill()
+            apple.kill()
 
     def check_death(self):
-        if self.health <= 0:
-            Particle(self.rect.topleft, self.image, self.groups()[0], LAYERS['fruit'], duration = 400)
-            self.image = self.stump_surf
-            self.rect = self.image.get_rect(midbottom = self.rect.midbottom)
-            self.hitbox = self.rect.copy().inflate(-10, self.rect.height * 0.6)
-            self.alive = False
+        if self.fruit_tree.fell():
+            Particle(self.rect.topleft, self.image, self.all_sprites, LAYERS['fruit'], duration = 400)
+            self.create_stump()
             self.player_add('wood')
+
+    def create_stump(self):
+        self.image = self.stump_surf
+        self.rect = self.image.get_rect(midbottom = self.rect.midbottom)
+        self.hitbox = self.rect.copy().inflate(-10, self.rect.height * 0.6)
+        self.all_sprites.refresh(self)
+        self.collision_sprites.refresh(self)
     
     def update(self,dt):
-        if self.alive:
+        if self.fruit_tree.alive:
             self.check_death()
 
-
-    def create_fruit(self):
-        for pos in self.apple_pos:
-            if randint(0,10) < 2:
-                x = pos[0] + self.rect.left  # x-coordinate from the apple_pos list
-                y = pos[1] + self.rect.top # y-coordinate from the apple_pos list
-                Generic(
-                    pos = (x, y),
-                    surf = self.apple_surf,
-                    groups = [self.apple_sprites,self.groups()[0]],
-                    z = LAYERS["fruit"])
+    def create_apples(self):
+        # one apple sprite for every spot of the fruit tree that carries one
+        for apple in self.apples.values():
+            apple.kill()
+        self.apples = {spot: Generic(
+            pos = self.apple_pos[spot],
+            surf = self.apple_surf,
+            groups = [self.apple_sprites,self.all_sprites],
+            z = LAYERS["fruit"]) for spot in self.fruit_tree.apples}
+
+    def get_state(self):
+        return (self.fruit_tree.health, self.fruit_tree.alive, [self.apple_pos[spot] for spot in self.fruit_tree.apples])
+
+    def load_state(self, state):
+        health, alive, apples = state
+        self.fruit_tree.health = health
+        if not alive:
+            self.fruit_tree.alive = False
+            self.create_stump()
+        self.fruit_tree.apples = [self.apple_pos.index(tuple(pos)) for pos in apples if tuple(pos) in self.apple_pos]
+        self.create_apples()
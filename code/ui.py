@@ -0,0 +1,96 @@
+import pygame
+from Settings import *
+
+class TextCache:
+    def __init__(self, font, max_entries = 256):
+        self.font = font
+        self.max_entries = max_entries
+        self.surfs = {}
+
+    def render(self, text, color = 'Black'):
+        key = (text, color)
+        if key not in self.surfs:
+            # counters only ever show a handful of values, so a full cache just starts over
+            if len(self.surfs) >= self.max_entries:
+                self.surfs.clear()
+            self.surfs[key] = self.font.render(text, False, color)
+        return self.surfs[key]
+
+class Widget:
+    def __init__(self, rect, get_value):
+        # rect is relative to the panel, get_value returns whatever the widget shows
+        self.rect = pygame.Rect(rect)
+        self.get_value = get_value
+        self.value = None
+        self.dirty = True
+
+    def refresh(self):
+        value = self.get_value()
+        if self.dirty or value != self.value:
+            self.value = value
+            self.dirty = False
+            return True
+        return False
+
+    def draw(self, surface):
+        pass
+
+class ImageWidget(Widget):
+    def __init__(self, rect, get_value, surfs, anchor):
+        super().__init__(rect, get_value)
+        self.surfs = surfs
+        self.anchor = anchor
+
+    def draw(self, surface):
+        surf = self.surfs[self.value]
+        surface.blit(surf, surf.get_rect(**{self.anchor: getattr(self.rect, self.anchor)}))
+
+class Panel:
+    def __init__(self, rect, colorkey = None):
+        self.display_surface = pygame.display.get_surface()
+        self.rect = pygame.Rect(rect)
+
+        # panels without translucent pixels use a colorkey, which blits a lot faster than per pixel alpha
+        self.colorkey = colorkey
+        if colorkey:
+            self.surf = pygame.Surface(self.rect.size)
+            self.surf.set_colorkey(colorkey)
+            self.clear_color = colorkey
+        else:
+            self.surf = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+            self.clear_color = (0, 0, 0, 0)
+        self.surf.fill(self.clear_color)
+        self.blit_surf = self.surf
+        self.widgets = []
+
+    def add(self, widget):
+        self.widgets.append(widget)
+        return widget
+
+    def refresh(self):
+        # only the area of widgets whose value changed is drawn again, overlapping widgets included
+        changed = [widget.rect for widget in self.widgets if widget.refresh()]
+        for rect in changed:
+            self.surf.set_clip(rect)
+            self.surf.fill(self.clear_color)
+            for widget in self.widgets:
+                if widget.rect.colliderect(rect):
+                    widget.draw(self.surf)
+            self.surf.set_clip(None)
+        if changed and self.colorkey:
+            # drawing onto a run length encoded surface corrupts it, so the encoded copy is only made to blit
+            self.blit_surf = self.surf.copy()
+            self.blit_surf.set_colorkey(self.colorkey, pygame.RLEACCEL)
+        return [rect.move(self.rect.topleft) for rect in changed]
+
+    def display(self, rects = None):
+        # rects: the only parts of the screen that were drawn again this frame
+        self.refresh()
+        if rects is None:
+            self.display_surface.blit(self.blit_surf, self.rect)
+            return
+        for rect in rects:
+            if rect.colliderect(self.rect):
+                self.display_surface.set_clip(rect)
+                self.display_surface.blit(self.blit_surf, self.rect)
+        self.display_surface.set_clip(None)
@@ -0,0 +1,10 @@
+class WorldClock:
+    def __init__(self):
+
+        # nights slept since the game started, every level remembers the last one it simulated
+        self.day = 0
+
+    def next_day(self):
+        self.day += 1
+
+world_clock = WorldClock()